@@ -0,0 +1,170 @@
+"""
+Admission control for upstream model calls.
+
+Each LLM route gets a gate with a cap on calls in flight and a bounded
+wait queue. When the cap is reached new calls wait their turn, premium
+first; when the queue is full too they are turned away at once with 429,
+and a call that waits longer than ADMISSION_QUEUE_TIMEOUT gets 503. Both
+carry a Retry-After estimated from how long calls on the route take.
+
+ADMISSION_PREMIUM_RESERVED slots per route are only handed to premium
+calls, so free traffic can't take the whole route. Routes that don't call
+the model (budget tracker, Secret Santa, ...) never touch a gate.
+
+Background jobs (jobs.py) run inside background(): they wait in a third
+lane, served after both interactive lanes, with no queue bound and no
+timeout, since a queued job should wait its turn rather than fail.
+
+The gate sits behind request coalescing in llm.py: callers that join an
+in-flight identical call don't take a slot.
+"""
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+from resilience import LLMUnavailable
+
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_PREMIUM_RESERVED = int(os.getenv("ADMISSION_PREMIUM_RESERVED", "2"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# (max in flight, max queued) where a route differs from the defaults
+ROUTE_LIMITS = {
+    "party-planner": (4, 16),
+    "create-wishlist": (4, 16),
+    "generate-gifts/batch": (4, 8),
+    "photo-caption": (12, 48),
+}
+
+rejections = metrics.Counter("admission_rejected_total", "LLM calls turned away by admission control",
+                             ("route", "lane", "reason"))
+queue_wait = metrics.Histogram("admission_wait_seconds", "Time LLM calls waited for an admission slot",
+                               ("route", "lane"))
+
+_background = contextvars.ContextVar("admission_background", default=False)
+
+
+class Overloaded(LLMUnavailable):
+    pass
+
+
+@contextmanager
+def background():
+    """Calls acquired inside wait in the background lane"""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+class Gate:
+    def __init__(self, route, limit, max_queue, reserved=ADMISSION_PREMIUM_RESERVED):
+        self.route = route
+        self.limit = limit
+        self.max_queue = max_queue
+        self.reserved = min(reserved, limit - 1)
+        self.in_flight = 0
+        self.waiting = {"premium": deque(), "free": deque(), "background": deque()}
+        # Moving average of how long a call holds its slot, for Retry-After
+        self.avg_hold = 2.0
+
+    def _has_room(self, premium):
+        return self.in_flight < (self.limit if premium else self.limit - self.reserved)
+
+    def queued(self):
+        """Interactive calls waiting; background jobs queue behind them and don't count"""
+        return len(self.waiting["premium"]) + len(self.waiting["free"])
+
+    def retry_after(self):
+        rounds = (self.queued() + 1) / self.limit
+        return max(1, math.ceil(rounds * self.avg_hold))
+
+    async def acquire(self, premium=False, timeout=ADMISSION_QUEUE_TIMEOUT):
+        """Wait for a slot; returns the time it was granted, to hand back to release()"""
+        if _background.get():
+            lane, premium, timeout = "background", False, None
+            ahead = self.queued() + len(self.waiting["background"])
+        else:
+            lane = "premium" if premium else "free"
+            ahead = self.waiting["premium"] if premium else self.queued()
+        if not ahead and self._has_room(premium):
+            self.in_flight += 1
+            return time.monotonic()
+        # Premium calls may queue past the limit by the reserved amount
+        if lane != "background" and self.queued() >= self.max_queue + (self.reserved if premium else 0):
+            rejections.inc(route=self.route, lane=lane, reason="queue_full")
+            raise Overloaded(f"Too many {self.route} requests right now, please retry shortly",
+                             status_code=429, retry_after=self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiting[lane].append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self.release(None)
+            else:
+                try:
+                    self.waiting[lane].remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            rejections.inc(route=self.route, lane=lane, reason="queue_timeout")
+            raise Overloaded("AI service is busy, please retry shortly", status_code=503,
+                             retry_after=self.retry_after()) from None
+        queue_wait.observe(time.monotonic() - started, route=self.route, lane=lane)
+        return time.monotonic()
+
+    def release(self, granted_at):
+        self.in_flight -= 1
+        if granted_at is not None:
+            self.avg_hold = 0.9 * self.avg_hold + 0.1 * (time.monotonic() - granted_at)
+        self._wake()
+
+    def _wake(self):
+        for lane, premium in (("premium", True), ("free", False), ("background", False)):
+            queue = self.waiting[lane]
+            while queue and self._has_room(premium):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+_gates = {}
+
+
+def gate(route):
+    route = route or "unknown"
+    found = _gates.get(route)
+    if found is None:
+        limit, max_queue = ROUTE_LIMITS.get(route, (ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE))
+        found = _gates[route] = Gate(route, limit, max_queue)
+    return found
+
+
+def busy():
+    """LLM calls holding or waiting for a slot, across every route"""
+    return sum(g.in_flight + g.queued() + len(g.waiting["background"]) for g in _gates.values())
+
+
+def _collect():
+    yield ("admission_in_flight", "gauge", "LLM calls holding an admission slot",
+           [({"route": route}, g.in_flight) for route, g in _gates.items()])
+    yield ("admission_queued", "gauge", "LLM calls waiting for an admission slot",
+           [({"route": route, "lane": lane}, len(waiters))
+            for route, g in _gates.items() for lane, waiters in g.waiting.items()])
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,113 @@
+"""
+JSON rendering and compression for API responses.
+
+Routes with a response_model are serialized straight to JSON bytes by
+Pydantic (FastAPI 0.130+ does this itself when the route has no explicit
+response class), skipping the jsonable_encoder walk over plain dicts.
+Everything else renders with orjson when it is installed, falling back
+to the stdlib encoder.
+
+CompressionMiddleware gzips (or brotli-compresses, when the `brotli`
+package is installed) JSON bodies of at least COMPRESS_MIN_SIZE bytes.
+Server-Sent Events, streamed bodies and responses that already carry a
+Content-Encoding (the precompressed frontend) pass through untouched.
+"""
+import gzip
+import json
+import os
+
+import anyio
+from fastapi.responses import JSONResponse as StdJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+import metrics
+from static_assets import brotli, choose_encoding
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json
+    orjson = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+# Dynamic bodies are compressed per request, so a fast brotli level rather than static_assets' 11
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+# Bodies this big are compressed off the event loop
+COMPRESS_THREAD_SIZE = 256 * 1024
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+compressed_responses = metrics.Counter("compressed_responses_total", "JSON responses sent compressed",
+                                       ("encoding",))
+compression_bytes = metrics.Counter("compression_bytes_total",
+                                    "JSON body bytes before (raw) and after (sent) compression",
+                                    ("encoding", "kind"))
+
+
+def dumps(data):
+    """Compact JSON text, via orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+if orjson is not None:
+    class JSONResponse(StdJSONResponse):
+        def render(self, content):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+else:
+    JSONResponse = StdJSONResponse
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """gzip/brotli for complete JSON bodies of at least minimum_size bytes"""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"), ENCODINGS)
+        if encoding == "identity":
+            return await self.app(scope, receive, send)
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("application/json") and "content-encoding" not in headers:
+                    # Hold the headers until the body shows whether it is worth compressing
+                    start = message
+                    return
+                return await send(message)
+            if start is None or message["type"] != "http.response.body":
+                return await send(message)
+            pending, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(pending)
+                return await send(message)
+            if len(body) >= COMPRESS_THREAD_SIZE:
+                compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers = MutableHeaders(scope=pending)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            compressed_responses.inc(encoding=encoding)
+            compression_bytes.inc(len(body), encoding=encoding, kind="raw")
+            compression_bytes.inc(len(compressed), encoding=encoding, kind="sent")
+            await send(pending)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,206 @@
+"""
+Budget aggregation shared by /budget-tracker and the bulk upload path.
+
+Items are added one at a time into columnar arrays. Categories and
+recipients are interned to small integer codes, so the per-category and
+per-recipient totals are running sums indexed by code. Everything is
+computed in the same single pass that reads the items. Item rows are only
+materialized again when the caller asks for them back.
+"""
+import codecs
+import csv
+import json
+import math
+from array import array
+
+CSV_COLUMNS = ("name", "category", "planned_amount", "actual_amount", "recipient")
+
+
+class BudgetParseError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+
+class _Interner:
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        self.planned = []
+        self.actual = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self.planned.append(0)
+            self.actual.append(0)
+        return code
+
+
+class BudgetAggregator:
+    def __init__(self, keep_items=False):
+        self.keep_items = keep_items
+        self.categories = _Interner()
+        self.recipients = _Interner()
+        self.total_planned = 0
+        self.total_actual = 0
+        self.count = 0
+        # Columns, only filled when keep_items is set
+        self.names = []
+        self.category_codes = array('I')
+        self.recipient_codes = array('i')
+        self.planned = array('d')
+        self.actual = array('d')  # NaN = no actual amount yet
+
+    def add(self, name, category, planned, actual=None, recipient=None):
+        spent = actual or 0
+        self.total_planned += planned
+        self.total_actual += spent
+        self.count += 1
+
+        c = self.categories.code(category)
+        self.categories.planned[c] += planned
+        self.categories.actual[c] += spent
+        r = -1
+        if recipient is not None:
+            r = self.recipients.code(recipient)
+            self.recipients.planned[r] += planned
+            self.recipients.actual[r] += spent
+
+        if self.keep_items:
+            self.names.append(name)
+            self.category_codes.append(c)
+            self.recipient_codes.append(r)
+            self.planned.append(planned)
+            self.actual.append(math.nan if actual is None else actual)
+
+    def _items_by_category(self):
+        grouped = [[] for _ in self.categories.values]
+        for i, name in enumerate(self.names):
+            actual = self.actual[i]
+            r = self.recipient_codes[i]
+            grouped[self.category_codes[i]].append({
+                "name": name,
+                "category": self.categories.values[self.category_codes[i]],
+                "planned_amount": self.planned[i],
+                "actual_amount": None if math.isnan(actual) else actual,
+                "recipient": self.recipients.values[r] if r >= 0 else None,
+            })
+        return grouped
+
+    def result(self, total_budget, currency, include_items=True):
+        """Same shape as the /budget-tracker response; `items` per category only if kept"""
+        grouped = self._items_by_category() if include_items and self.keep_items else None
+        categories = {}
+        for c, category in enumerate(self.categories.values):
+            entry = {"planned": self.categories.planned[c], "actual": self.categories.actual[c]}
+            if grouped is not None:
+                entry["items"] = grouped[c]
+            categories[category] = entry
+
+        return {
+            "total_budget": total_budget,
+            "total_planned": self.total_planned,
+            "total_spent": self.total_actual,
+            "remaining": total_budget - self.total_actual,
+            "categories": categories,
+            "currency": currency,
+            "over_budget": self.total_actual > total_budget
+        }
+
+    def recipient_totals(self):
+        return {
+            recipient: {"planned": self.recipients.planned[r], "actual": self.recipients.actual[r]}
+            for r, recipient in enumerate(self.recipients.values)
+        }
+
+
+def _amount(value, line, field, required=False):
+    if value is None or value == "":
+        if required:
+            raise BudgetParseError(line, f"missing {field}")
+        return None
+    if isinstance(value, bool):
+        raise BudgetParseError(line, f"invalid {field}: {value!r}")
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise BudgetParseError(line, f"invalid {field}: {value!r}")
+    if not math.isfinite(amount):
+        raise BudgetParseError(line, f"invalid {field}: {value!r}")
+    return amount
+
+
+def _text(value, line, field, required=False):
+    if value is None or value == "":
+        if required:
+            raise BudgetParseError(line, f"missing {field}")
+        return None
+    if not isinstance(value, str):
+        raise BudgetParseError(line, f"{field} must be a string, got {value!r}")
+    return value
+
+
+async def iter_lines(chunks):
+    """Decode a byte stream into text lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def load_csv(lines, aggregator):
+    """Feed CSV rows (header: name,category,planned_amount,actual_amount,recipient)"""
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        row = next(csv.reader([line]))
+        if header is None:
+            header = [h.strip().lower() for h in row]
+            missing = {"name", "category", "planned_amount"} - set(header)
+            if missing:
+                raise BudgetParseError(line_no, f"missing columns: {', '.join(sorted(missing))}")
+            columns = [header.index(c) if c in header else None for c in CSV_COLUMNS]
+            continue
+        values = [row[i].strip() if i is not None and i < len(row) else None for i in columns]
+        name, category, planned, actual, recipient = values
+        aggregator.add(
+            _text(name, line_no, "name", required=True),
+            _text(category, line_no, "category", required=True),
+            _amount(planned, line_no, "planned_amount", required=True),
+            _amount(actual, line_no, "actual_amount"),
+            _text(recipient, line_no, "recipient"),
+        )
+
+
+async def load_ndjson(lines, aggregator):
+    """Feed one JSON object per line, with the same fields as BudgetItem"""
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BudgetParseError(line_no, f"invalid JSON: {e.msg}")
+        if not isinstance(item, dict):
+            raise BudgetParseError(line_no, "expected a JSON object")
+        aggregator.add(
+            _text(item.get("name"), line_no, "name", required=True),
+            _text(item.get("category"), line_no, "category", required=True),
+            _amount(item.get("planned_amount"), line_no, "planned_amount", required=True),
+            _amount(item.get("actual_amount"), line_no, "actual_amount"),
+            _text(item.get("recipient"), line_no, "recipient"),
+        )
@@ -0,0 +1,226 @@
+"""
+Server-side budget sessions stored in SQLite.
+
+Each session keeps its running totals (overall and per category) next to
+the items. Adding, updating or removing one item applies only that item's
+delta to the totals inside one transaction, so a change costs O(1)
+regardless of how many items the session already has. Reading a session
+returns the same shape as /budget-tracker.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS budget_sessions (
+    id TEXT PRIMARY KEY,
+    total_budget REAL NOT NULL,
+    currency TEXT NOT NULL,
+    total_planned REAL NOT NULL DEFAULT 0,
+    total_actual REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS budget_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    planned_amount REAL NOT NULL,
+    actual_amount REAL,
+    recipient TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_budget_items_session ON budget_items (session_id, id);
+CREATE TABLE IF NOT EXISTS budget_category_totals (
+    session_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    planned REAL NOT NULL DEFAULT 0,
+    actual REAL NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (session_id, category)
+);
+"""
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class ItemNotFound(KeyError):
+    pass
+
+
+class BudgetStore:
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = storage.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE so concurrent workers serialize their read-modify-write
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _apply(self, conn, session_id, category, planned, actual, count):
+        """Add a delta to the session and category totals"""
+        conn.execute(
+            "UPDATE budget_sessions SET total_planned = total_planned + ?, total_actual = total_actual + ? WHERE id = ?",
+            (planned, actual, session_id),
+        )
+        conn.execute(
+            "INSERT INTO budget_category_totals (session_id, category, planned, actual, item_count) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (session_id, category) DO UPDATE SET"
+            " planned = planned + excluded.planned, actual = actual + excluded.actual,"
+            " item_count = item_count + excluded.item_count",
+            (session_id, category, planned, actual, count),
+        )
+        conn.execute(
+            "DELETE FROM budget_category_totals WHERE session_id = ? AND category = ? AND item_count <= 0",
+            (session_id, category),
+        )
+
+    def _check_session(self, conn, session_id):
+        if conn.execute("SELECT 1 FROM budget_sessions WHERE id = ?", (session_id,)).fetchone() is None:
+            raise SessionNotFound(session_id)
+
+    def _insert_item(self, conn, session_id, item):
+        cursor = conn.execute(
+            "INSERT INTO budget_items (session_id, name, category, planned_amount, actual_amount, recipient)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, item.name, item.category, item.planned_amount, item.actual_amount, item.recipient),
+        )
+        self._apply(conn, session_id, item.category, item.planned_amount, item.actual_amount or 0, 1)
+        return cursor.lastrowid
+
+    def create_session(self, total_budget, currency, items=()):
+        session_id = uuid.uuid4().hex[:12]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO budget_sessions (id, total_budget, currency, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, total_budget, currency, time.time()),
+            )
+            for item in items:
+                self._insert_item(conn, session_id, item)
+        return session_id
+
+    def add_item(self, session_id, item):
+        with self._transaction() as conn:
+            self._check_session(conn, session_id)
+            return self._insert_item(conn, session_id, item)
+
+    def _get_item(self, conn, session_id, item_id):
+        row = conn.execute(
+            "SELECT category, planned_amount, actual_amount FROM budget_items WHERE id = ? AND session_id = ?",
+            (item_id, session_id),
+        ).fetchone()
+        if row is None:
+            raise ItemNotFound(item_id)
+        return row
+
+    def update_item(self, session_id, item_id, item):
+        with self._transaction() as conn:
+            category, planned, actual = self._get_item(conn, session_id, item_id)
+            conn.execute(
+                "UPDATE budget_items SET name = ?, category = ?, planned_amount = ?, actual_amount = ?, recipient = ?"
+                " WHERE id = ?",
+                (item.name, item.category, item.planned_amount, item.actual_amount, item.recipient, item_id),
+            )
+            if category == item.category:
+                self._apply(conn, session_id, category, item.planned_amount - planned,
+                            (item.actual_amount or 0) - (actual or 0), 0)
+            else:
+                self._apply(conn, session_id, category, -planned, -(actual or 0), -1)
+                self._apply(conn, session_id, item.category, item.planned_amount, item.actual_amount or 0, 1)
+
+    def remove_item(self, session_id, item_id):
+        with self._transaction() as conn:
+            category, planned, actual = self._get_item(conn, session_id, item_id)
+            conn.execute("DELETE FROM budget_items WHERE id = ?", (item_id,))
+            self._apply(conn, session_id, category, -planned, -(actual or 0), -1)
+
+    def delete_session(self, session_id):
+        with self._transaction() as conn:
+            self._check_session(conn, session_id)
+            conn.execute("DELETE FROM budget_items WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM budget_category_totals WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM budget_sessions WHERE id = ?", (session_id,))
+
+    @contextmanager
+    def _snapshot(self):
+        # One read transaction, so every SELECT sees the same committed state
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+
+    def _totals(self, conn, session_id):
+        row = conn.execute(
+            "SELECT total_budget, currency, total_planned, total_actual FROM budget_sessions WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            raise SessionNotFound(session_id)
+        categories = conn.execute(
+            "SELECT category, planned, actual FROM budget_category_totals WHERE session_id = ?",
+            (session_id,),
+        ).fetchall()
+        total_budget, currency, total_planned, total_actual = row
+        return {
+            "total_budget": total_budget,
+            "total_planned": total_planned,
+            "total_spent": total_actual,
+            "remaining": total_budget - total_actual,
+            "categories": {category: {"planned": planned, "actual": actual} for category, planned, actual in categories},
+            "currency": currency,
+            "over_budget": total_actual > total_budget
+        }
+
+    def totals(self, session_id):
+        """Running totals only, without touching the items table"""
+        with self._snapshot() as conn:
+            return self._totals(conn, session_id)
+
+    def summary(self, session_id):
+        """Same response as /budget-tracker for the session's current items"""
+        with self._snapshot() as conn:
+            result = self._totals(conn, session_id)
+            rows = conn.execute(
+                "SELECT id, name, category, planned_amount, actual_amount, recipient FROM budget_items"
+                " WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        categories = result["categories"]
+        for entry in categories.values():
+            entry["items"] = []
+        for item_id, name, category, planned, actual, recipient in rows:
+            categories[category]["items"].append({
+                "name": name,
+                "category": category,
+                "planned_amount": planned,
+                "actual_amount": actual,
+                "recipient": recipient,
+                "item_id": item_id,
+            })
+        return result
+
+budget_store = BudgetStore()
@@ -0,0 +1,261 @@
+"""
+Response cache for the LLM endpoints.
+
+Lookups go through an in-process LRU first and, when CACHE_DB_PATH is set,
+a SQLite tier that survives restarts. Keys are built from a normalized
+view of the request so near-identical payloads (different casing or
+interest order, budgets in the same bucket) share an entry.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import metrics
+import storage
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")  # unset = memory only
+
+# Seconds an entry stays fresh, per endpoint
+CACHE_TTLS = {
+    "generate-gifts": int(os.getenv("CACHE_TTL_GIFTS", "21600")),
+    "photo-caption": int(os.getenv("CACHE_TTL_CAPTION", "3600")),
+    "generate-card": int(os.getenv("CACHE_TTL_CARD", "3600")),
+    "generate-message": int(os.getenv("CACHE_TTL_MESSAGE", "3600")),
+}
+DEFAULT_TTL = 3600
+
+# Upper edges of the budget buckets; anything above the last one shares a bucket
+BUDGET_BUCKETS = [10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000, 2500, 5000]
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry expiry time"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def expires_at(self, key):
+        with self._lock:
+            item = self._data.get(key)
+        return item[0] if item is not None else None
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk tier; values are stored as JSON. Expired rows are purged on write, at most once per PURGE_INTERVAL"""
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path):
+        self._conn = storage.connect(path)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires_at)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl),
+            )
+            if now - self._last_purge >= self.PURGE_INTERVAL:
+                self._last_purge = now
+                self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH, ttls=None):
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteCache(db_path) if db_path else None
+        self.ttls = ttls or CACHE_TTLS
+        self.stats = {}
+
+    def _count(self, endpoint, field):
+        counters = self.stats.setdefault(endpoint, {"hits": 0, "misses": 0, "bypassed": 0})
+        counters[field] += 1
+
+    def get(self, endpoint, key):
+        full_key = f"{endpoint}:{key}"
+        value = self.memory.get(full_key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(full_key)
+            if value is not None:
+                self.memory.set(full_key, value, self.ttls.get(endpoint, DEFAULT_TTL))
+        self._count(endpoint, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, endpoint, key, value):
+        full_key = f"{endpoint}:{key}"
+        ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+        self.memory.set(full_key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(full_key, value, ttl)
+
+    def ttl_left(self, endpoint, key):
+        """Seconds until the in-memory entry expires, or None if it isn't cached"""
+        expires_at = self.memory.expires_at(f"{endpoint}:{key}")
+        return expires_at - time.time() if expires_at is not None else None
+
+    def bypass(self, endpoint):
+        self._count(endpoint, "bypassed")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def snapshot(self):
+        return {"entries": len(self.memory), "disk": self.disk is not None, "endpoints": self.stats}
+
+
+response_cache = ResponseCache()
+
+
+def _collect():
+    samples = [({"endpoint": endpoint, "result": result}, count)
+               for endpoint, counters in response_cache.stats.items() for result, count in counters.items()]
+    yield "cache_requests_total", "counter", "Response cache lookups by endpoint and result", samples
+    yield "cache_entries", "gauge", "Entries in the in-memory response cache", [({}, len(response_cache.memory))]
+
+
+metrics.register_collector(_collect)
+
+
+def cache_directives(cache_control):
+    """Parse a Cache-Control request header into (read_allowed, write_allowed)"""
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives or "max-age=0" in directives:
+        return False, True
+    return True, True
+
+
+def _text(value):
+    return " ".join(str(value).lower().split()) if value is not None else None
+
+
+def budget_bucket(amount):
+    if amount is None:
+        return None
+    for edge in BUDGET_BUCKETS:
+        if amount <= edge:
+            return edge
+    return BUDGET_BUCKETS[-1] + 1
+
+
+def _time_bucket():
+    now = datetime.now()
+    return f"{now.year}-{now.month:02d}"
+
+
+def _digest(fields):
+    raw = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def gift_cache_key(request):
+    return _digest({
+        "recipient": _text(request.recipient_name),
+        "age": request.age,
+        "gender": _text(request.gender),
+        "relationship": _text(request.relationship),
+        "interests": sorted({_text(i) for i in request.interests if i and i.strip()}),
+        "budget": [budget_bucket(request.budget_min), budget_bucket(request.budget_max)],
+        "occasion": _text(request.occasion),
+        "personality": _text(request.personality),
+        "notes": _text(request.special_notes),
+        "location": _text(request.location),
+        "currency": request.currency.upper(),
+        "time": _time_bucket(),
+    })
+
+
+def caption_cache_key(request):
+    return _digest({
+        "photo": _text(request.photo_description),
+        "occasion": _text(request.occasion),
+        "tone": _text(request.tone),
+        "hashtags": request.hashtags,
+        "time": _time_bucket(),
+    })
+
+
+def card_cache_key(request):
+    return _digest({
+        "occasion": _text(request.occasion),
+        "recipient": _text(request.recipient_name),
+        "sender": _text(request.sender_name),
+        "relationship": _text(request.relationship),
+        "tone": _text(request.tone),
+        "custom": _text(request.custom_message),
+        "style": _text(request.card_style),
+        "time": _time_bucket(),
+    })
+
+
+def message_cache_key(request):
+    return _digest({
+        "occasion": _text(request.occasion),
+        "recipient": _text(request.recipient_name),
+        "relationship": _text(request.relationship),
+        "tone": _text(request.tone),
+        "gift": _text(request.gift_context),
+        "special": _text(request.special_message),
+        "time": _time_bucket(),
+    })
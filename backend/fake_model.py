@@ -0,0 +1,161 @@
+"""
+Offline stand-ins for genai.GenerativeModel, used by the benchmarks and
+selected for the app with LLM_BACKEND=fake.
+
+It sleeps for `latency` seconds (without blocking the event loop on the
+async path) and returns a canned text, so throughput can be measured
+without spending API quota. With stream=True the text is replayed as
+recorded `chunks`, `chunk_delay` seconds apart.
+
+Failures can be injected too: the first `fail_first` calls and then a
+random `error_rate` share of calls raise ServiceUnavailable, and
+`latency_jitter` adds up to that many seconds on top of `latency`.
+
+ReplayModel answers from a file of recorded responses matched on prompt
+text, with latencies drawn from a seeded distribution, so runs repeat
+exactly.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+DEFAULT_RECORDINGS = Path(__file__).parent / "fake_responses.json"
+
+
+class ServiceUnavailable(Exception):
+    """Same name as the google.api_core error, so it is treated as retryable"""
+
+
+class InvalidArgument(Exception):
+    """Same name as the google.api_core error; not retryable"""
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield FakeResponse(chunk)
+
+
+class FakeModel:
+    def __init__(self, text="1. Cozy Blanket\nA soft fleece throw.", latency=0.2, model_name="models/fake",
+                 chunks=None, chunk_delay=0.05, fail_first=0, error_rate=0.0, error=ServiceUnavailable,
+                 latency_jitter=0.0, seed=None):
+        self.text = text if chunks is None else "".join(chunks)
+        self.latency = latency
+        self.model_name = model_name
+        self.chunks = chunks or [self.text]
+        self.chunk_delay = chunk_delay
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.error = error
+        self.latency_jitter = latency_jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _next_call(self):
+        """Returns this call's latency, or raises the injected error"""
+        self.calls += 1
+        if self.calls <= self.fail_first or self.rng.random() < self.error_rate:
+            raise self.error("injected failure")
+        return self.latency + self.rng.uniform(0, self.latency_jitter)
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self._next_call())
+        return FakeResponse(self.text)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        latency = self._next_call()
+        if stream:
+            return FakeStream(self.chunks, self.chunk_delay)
+        await asyncio.sleep(latency)
+        return FakeResponse(self.text)
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a function of an RNG:
+    fixed:0.5, uniform:0.2,1.0, normal:0.8,0.2 or lognormal:0.8,0.4
+    (lognormal takes the median in seconds and sigma).
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+class ReplayModel:
+    """
+    Replays recorded responses. Each recording has a `match` regex tried in
+    order against the prompt and either a `text`, a list of `chunks` for
+    streaming, or `per_recipient` gifts that are expanded for every "#N:"
+    recipient in a batch prompt.
+    """
+
+    def __init__(self, recordings, latency="fixed:0.2", chunk_delay=0.05, seed=0, model_name="models/fake-replay"):
+        self.recordings = [dict(r, pattern=re.compile(r["match"], re.I | re.S)) for r in recordings]
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.chunk_delay = chunk_delay
+        self.rng = random.Random(seed)
+        self.model_name = model_name
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path=None, **kwargs):
+        with open(path or DEFAULT_RECORDINGS, encoding="utf-8") as f:
+            return cls(json.load(f)["recordings"], **kwargs)
+
+    @classmethod
+    def from_env(cls, model_name="models/fake-replay"):
+        return cls.from_file(
+            os.getenv("FAKE_LLM_RECORDINGS") or None,
+            latency=os.getenv("FAKE_LLM_LATENCY", "lognormal:0.8,0.4"),
+            chunk_delay=float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0.05")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+            model_name=model_name,
+        )
+
+    def _chunks(self, prompt):
+        for recording in self.recordings:
+            if recording["pattern"].search(prompt):
+                break
+        else:
+            return ["OK"]
+        if "per_recipient" in recording:
+            indexes = re.findall(r"^#(\d+):", prompt, flags=re.M)
+            return [json.dumps({i: recording["per_recipient"] for i in indexes}, ensure_ascii=False)]
+        return recording.get("chunks") or [recording["text"]]
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency(self.rng))
+        return FakeResponse("".join(self._chunks(prompt)))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        chunks = self._chunks(prompt)
+        if stream:
+            return FakeStream(chunks, self.chunk_delay)
+        await asyncio.sleep(self.latency(self.rng))
+        return FakeResponse("".join(chunks))
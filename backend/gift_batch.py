@@ -0,0 +1,90 @@
+"""
+Batch gift generation for several recipients at once.
+
+Recipients are packed greedily into shared prompts while the prompt stays
+under BATCH_PROMPT_TOKEN_BUDGET and holds at most BATCH_MAX_PER_PROMPT
+recipients (each one adds roughly 150 output tokens). The packed prompts
+run concurrently, with at most BATCH_CONCURRENCY in flight, and results
+are yielded per recipient as each prompt completes. A recipient missing
+from a batch reply falls back to its own single-recipient call.
+"""
+import asyncio
+import os
+
+import llm
+import metrics
+import prompts
+from gift_pages import GIFT_PAGE_SIZE
+from gifts import (JSON_GENERATION_CONFIG, batch_prompt, batch_recipient_block, dedupe, fill_defaults,
+                   generate_gift_list, parse_batch_json)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_PROMPT_TOKEN_BUDGET = int(os.getenv("BATCH_PROMPT_TOKEN_BUDGET", "1200"))
+BATCH_MAX_PER_PROMPT = int(os.getenv("BATCH_MAX_PER_PROMPT", "6"))
+MAX_BATCH_SIZE = 50
+
+
+def pack(indexed_requests, token_budget=None, max_per_prompt=None):
+    """Split [(index, request)] into groups that each fit one prompt"""
+    token_budget = token_budget or BATCH_PROMPT_TOKEN_BUDGET
+    max_per_prompt = max_per_prompt or BATCH_MAX_PER_PROMPT
+    overhead = prompts.GIFTS_BATCH.static_tokens
+    groups, current, used = [], [], overhead
+    for index, request in indexed_requests:
+        cost = llm.estimate_tokens(batch_recipient_block(index, request))
+        if current and (used + cost > token_budget or len(current) >= max_per_prompt):
+            groups.append(current)
+            current, used = [], overhead
+        current.append((index, request))
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _generate_one(index, request):
+    try:
+        gifts, _ = await generate_gift_list(request, GIFT_PAGE_SIZE)
+        return index, gifts, None
+    except Exception as e:
+        return index, None, e
+
+
+async def _run_group(group, semaphore):
+    """Returns [(index, gifts, error)] for every recipient in the group"""
+    async with semaphore:
+        if len(group) == 1:
+            return [await _generate_one(*group[0])]
+
+        with metrics.stage("prompt", "generate-gifts/batch"):
+            prompt = batch_prompt([batch_recipient_block(index, request) for index, request in group], GIFT_PAGE_SIZE)
+        try:
+            text = await llm.generate_text(prompt, route="generate-gifts/batch", generation_config=JSON_GENERATION_CONFIG)
+            with metrics.stage("response_parse", "generate-gifts/batch"):
+                parsed = parse_batch_json(text)
+        except ValueError:
+            parsed = {}
+        except Exception as e:
+            return [(index, None, e) for index, _ in group]
+
+        results = []
+        for index, request in group:
+            if parsed.get(index):
+                results.append((index, fill_defaults(dedupe(parsed[index]), request)[:GIFT_PAGE_SIZE], None))
+            else:
+                results.append(await _generate_one(index, request))
+        return results
+
+
+async def generate_batch(indexed_requests, concurrency=None):
+    """Yield (index, gifts, error) per recipient in completion order"""
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_run_group(group, semaphore)) for group in pack(indexed_requests)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for result in await finished:
+                yield result
+    finally:
+        # Client went away: stop the groups still running
+        for task in tasks:
+            task.cancel()
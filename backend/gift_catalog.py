@@ -0,0 +1,152 @@
+"""
+Bundled gift catalog for instant suggestions without a model call.
+
+gift_catalog.json holds over a hundred hand-picked gifts with USD prices,
+interest tags, the age bands and relationships they suit. On load they are
+indexed by interest, age band and relationship, plus a price-sorted list,
+so answering a GiftRequest is a few set lookups and a small sort (well
+under a millisecond).
+
+Used by POST /generate-gifts/instant, as the first paint of
+/generate-gifts?stream=true, and as the answer when the model call fails
+or misses its deadline ("source": "catalog").
+"""
+import bisect
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import metrics
+from gifts import USD_RATES, currency_symbol
+
+GIFT_CATALOG_PATH = os.getenv("GIFT_CATALOG_PATH", str(Path(__file__).parent / "gift_catalog.json"))
+
+# (upper age, band); anyone older is a senior
+AGE_BANDS = ((12, "kid"), (19, "teen"), (64, "adult"))
+
+catalog_suggestions = metrics.Counter("catalog_suggestions_total", "Gift lists answered from the local catalog", ("reason",))
+
+
+def age_band(age):
+    if age is None:
+        return None
+    for upper, band in AGE_BANDS:
+        if age <= upper:
+            return band
+    return "senior"
+
+
+def _round_price(value):
+    if value < 100:
+        return round(value)
+    if value < 1000:
+        return int(round(value / 5) * 5)
+    return int(round(value, -2))
+
+
+class GiftCatalog:
+    def __init__(self, path=GIFT_CATALOG_PATH):
+        self.path = path
+        self.gifts = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        aliases = {k.lower(): v for k, v in data.get("aliases", {}).items()}
+        relationships = {name.lower(): group for group, names in data.get("relationships", {}).items()
+                         for name in names}
+        gifts = data["gifts"]
+        by_interest = defaultdict(set)
+        by_age = defaultdict(set)
+        by_relationship = defaultdict(set)
+        for i, gift in enumerate(gifts):
+            for tag in gift["interests"]:
+                by_interest[tag].add(i)
+            # No ages / relationships listed = suits anyone
+            for band in gift["ages"] or ("any",):
+                by_age[band].add(i)
+            for group in gift["relationships"] or ("any",):
+                by_relationship[group].add(i)
+        price_order = sorted(range(len(gifts)), key=lambda i: gifts[i]["price"][0])
+        # Swap everything in at once so readers never see half an index
+        (self.aliases, self.relationships, self.by_interest, self.by_age, self.by_relationship,
+         self.price_order, self.price_keys, self.gifts) = (
+            aliases, relationships, by_interest, by_age, by_relationship,
+            price_order, [gifts[i]["price"][0] for i in price_order], gifts)
+        return self
+
+    def ensure_loaded(self):
+        if not self.gifts:
+            with self._lock:
+                if not self.gifts:
+                    self.load()
+        return self
+
+    def _interest_tags(self, interests):
+        """{tag: interest as the user wrote it} for every catalog tag an interest maps to"""
+        tags = {}
+        for interest in interests:
+            text = interest.strip().lower()
+            for word in [text] + re.findall(r"[a-z][a-z-]+", text):
+                tag = self.aliases.get(word, word)
+                if tag not in self.by_interest and tag.endswith("s"):
+                    tag = self.aliases.get(tag[:-1], tag[:-1])
+                if tag in self.by_interest:
+                    tags.setdefault(tag, interest.strip())
+        return tags
+
+    def suggest(self, request, count=3, exclude=()):
+        """Best `count` catalog gifts for a GiftRequest, priced in its currency; skips names in exclude"""
+        self.ensure_loaded()
+        rate = USD_RATES.get(request.currency, 1.0)
+        symbol = currency_symbol(request.currency)
+        budget_min = (request.budget_min or 20) / rate
+        budget_max = (request.budget_max or 100) / rate
+        tags = self._interest_tags(request.interests)
+        band = age_band(request.age)
+        group = self.relationships.get(request.relationship.strip().lower())
+
+        allowed = self.by_relationship["any"] | self.by_relationship.get(group, set())
+        if band:
+            allowed &= self.by_age["any"] | self.by_age[band]
+        # Gifts matching an interest; topped up with anything starting within budget
+        candidates = set().union(*(self.by_interest[tag] for tag in tags)) & allowed
+        if len(candidates) < count + len(exclude):
+            candidates.update(allowed.intersection(self.price_order[:bisect.bisect_right(self.price_keys, budget_max)]))
+
+        excluded = {name.lower() for name in exclude}
+        budget_mid = (budget_min + budget_max) / 2
+        ranked = []
+        for i in candidates:
+            gift = self.gifts[i]
+            if gift["name"].lower() in excluded:
+                continue
+            low, high = gift["price"]
+            matched = [tag for tag in gift["interests"] if tag in tags]
+            score = 4 * len(matched)
+            score += 2 if low <= budget_max and high >= budget_min else 0
+            score += 1 if band and band in gift["ages"] else 0
+            score += 1 if group and group in gift["relationships"] else 0
+            ranked.append((-score, abs((low + high) / 2 - budget_mid), i, matched))
+        ranked.sort()
+        return [self._format(self.gifts[i], matched, tags, rate, symbol) for _, _, i, matched in ranked[:count]]
+
+    def _format(self, gift, matched, tags, rate, symbol):
+        low, high = (_round_price(p * rate) for p in gift["price"])
+        reason = gift["reason"] or "A thoughtful pick"
+        if matched:
+            reason = f"For their love of {tags[matched[0]]}: {reason[0].lower()}{reason[1:]}"
+        return {
+            "name": gift["name"],
+            "description": gift["description"],
+            "reason": reason,
+            "price_range": f"{symbol}{low}" if low == high else f"{symbol}{low}-{symbol}{high}",
+            "where_to_buy": gift["where_to_buy"],
+        }
+
+
+gift_catalog = GiftCatalog()
@@ -0,0 +1,76 @@
+"""
+"More ideas" pages for /generate-gifts.
+
+With ?pages=N the model is asked for N pages of gifts in a single call.
+The first page goes back with an opaque next_cursor; GET
+/generate-gifts/more?cursor=... serves the following pages from memory,
+so three pages of ideas cost one upstream call instead of three.
+
+Gifts are deduplicated by name (gifts.dedupe) before paging, so no idea
+shows up on two pages. Cursors live in an LRU for GIFT_CURSOR_TTL
+seconds; an expired or evicted cursor answers 410 and the client
+generates again.
+"""
+import os
+import secrets
+
+import metrics
+from cache import LRUCache
+from gifts import dedupe
+
+GIFT_PAGE_SIZE = int(os.getenv("GIFT_PAGE_SIZE", "3"))
+GIFT_MAX_PAGES = int(os.getenv("GIFT_MAX_PAGES", "3"))
+GIFT_CURSOR_TTL = int(os.getenv("GIFT_CURSOR_TTL", "600"))
+GIFT_CURSOR_MAX = int(os.getenv("GIFT_CURSOR_MAX", "4096"))
+
+cursors = LRUCache(GIFT_CURSOR_MAX)
+
+cursor_pages = metrics.Counter("gift_cursor_pages_total", "Follow-up gift pages by result", ("result",))
+
+
+class CursorExpired(KeyError):
+    pass
+
+
+def clamp_pages(pages):
+    return min(max(pages, 1), GIFT_MAX_PAGES)
+
+
+def _page(entry, offset):
+    gifts = entry["gifts"][offset:offset + GIFT_PAGE_SIZE]
+    next_offset = offset + GIFT_PAGE_SIZE
+    more = next_offset < len(entry["gifts"])
+    return {
+        "gifts": gifts,
+        "recipient": entry["recipient"],
+        "source": entry["source"],
+        "page": offset // GIFT_PAGE_SIZE + 1,
+        "next_cursor": f"{entry['token']}.{next_offset}" if more else None,
+    }
+
+
+def first_page(gifts, recipient, source):
+    """Response for the first page; keeps the rest behind a cursor if there is more than one page"""
+    gifts = dedupe(gifts)
+    entry = {"token": secrets.token_urlsafe(12), "gifts": gifts, "recipient": recipient, "source": source}
+    if len(gifts) > GIFT_PAGE_SIZE:
+        cursors.set(entry["token"], entry, GIFT_CURSOR_TTL)
+    return _page(entry, 0)
+
+
+def next_page(cursor):
+    """The page a cursor points at; raises CursorExpired if it is unknown or has expired"""
+    token, _, offset = cursor.rpartition(".")
+    entry = cursors.get(token) if offset.isdigit() else None
+    if entry is None or int(offset) >= len(entry["gifts"]):
+        cursor_pages.inc(result="expired")
+        raise CursorExpired(cursor)
+    cursor_pages.inc(result="served")
+    return _page(entry, int(offset))
+
+
+def _collect():
+    yield "gift_cursors", "gauge", "Gift page cursors held in memory", [({}, len(cursors))]
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,202 @@
+"""
+Gift prompt building and response parsing.
+
+By default /generate-gifts asks the model for a compact JSON array and
+validates it against the Gift model. If the reply isn't valid JSON (or
+GIFT_STRUCTURED_OUTPUT=0) the original line-by-line parser is used on the
+same text, so a malformed reply never costs a second model call.
+"""
+import json
+import os
+import re
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError
+
+import llm
+import metrics
+import prompts
+
+GIFT_STRUCTURED_OUTPUT = os.getenv("GIFT_STRUCTURED_OUTPUT", "1") != "0"
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'GBP': '£', 'INR': '₹', 'JPY': '¥', 'AUD': 'A$', 'CAD': 'C$', 'CNY': '¥', 'AED': 'د.إ'}
+# Approximate units per US dollar, for the catalog's USD prices
+USD_RATES = {'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'INR': 83.0, 'JPY': 150.0, 'AUD': 1.52, 'CAD': 1.36, 'CNY': 7.2, 'AED': 3.67}
+
+
+class Gift(BaseModel):
+    name: str
+    description: str = 'A thoughtful gift'
+    reason: str = 'Perfect for them'
+    price_range: Optional[str] = None
+    where_to_buy: str = 'Online or local stores'
+
+
+def currency_symbol(currency):
+    return CURRENCY_SYMBOLS.get(currency, '$')
+
+
+def text_prompt(request, count=3):
+    symbol = currency_symbol(request.currency)
+    return prompts.GIFTS_TEXT.render(
+        count=count, recipient_name=request.recipient_name, occasion=request.occasion,
+        age=request.age or 'Not specified', relationship=request.relationship,
+        interests=', '.join(request.interests) if request.interests else 'General',
+        location=request.location or 'Not specified',
+        budget=f"{symbol}{request.budget_min or 20} - {symbol}{request.budget_max or 100}",
+        currency=request.currency, symbol=symbol, personality=request.personality or 'Friendly',
+    )
+
+
+def _recipient_line(request):
+    symbol = currency_symbol(request.currency)
+    return (f"{request.recipient_name}; occasion: {request.occasion}; age: {request.age or '?'}; "
+            f"relationship: {request.relationship}; interests: {', '.join(request.interests) if request.interests else 'general'}; "
+            f"location: {request.location or 'any'}; budget: {symbol}{request.budget_min or 20}-{symbol}{request.budget_max or 100} {request.currency}; "
+            f"personality: {request.personality or 'friendly'}")
+
+
+def batch_recipient_block(index, request):
+    return f"#{index}: {_recipient_line(request)}"
+
+
+def batch_prompt(blocks, count=3):
+    """One prompt for several recipients; blocks come from batch_recipient_block()"""
+    return prompts.GIFTS_BATCH.render(count=count, recipients="\n".join(blocks))
+
+
+def structured_prompt(request, count=3):
+    symbol = currency_symbol(request.currency)
+    return prompts.GIFTS_STRUCTURED.render(
+        count=count, occasion=request.occasion, recipient_name=request.recipient_name,
+        age=request.age or '?', relationship=request.relationship,
+        interests=', '.join(request.interests) if request.interests else 'general',
+        location=request.location or 'any',
+        budget=f"{symbol}{request.budget_min or 20}-{symbol}{request.budget_max or 100}",
+        currency=request.currency, symbol=symbol, personality=request.personality or 'friendly',
+    )
+
+
+def parse_gifts_text(text):
+    """Heuristic parser for free-text replies: numbered names followed by detail lines"""
+    gifts = []
+    current = {}
+
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        # New gift starts
+        if line[0].isdigit() and '.' in line[:3]:
+            if current and 'name' in current:
+                gifts.append(current)
+            current = {'name': line.split('.', 1)[1].strip() if '.' in line else line}
+        elif current:
+            # Add to description
+            if 'description' not in current:
+                current['description'] = line
+            elif 'reason' not in current:
+                current['reason'] = line
+            elif 'price_range' not in current:
+                current['price_range'] = line
+            elif 'where_to_buy' not in current:
+                current['where_to_buy'] = line
+
+    if current and 'name' in current:
+        gifts.append(current)
+    return gifts
+
+
+def parse_gifts_json(text):
+    """Parse a JSON reply into validated gift dicts; raises ValueError if nothing usable"""
+    data = json.loads(_strip_fences(text))
+    if isinstance(data, dict):
+        data = data.get("gifts", [data])
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of gifts")
+
+    gifts = []
+    for item in data:
+        try:
+            gifts.append(Gift.model_validate(item).model_dump(exclude_none=True))
+        except ValidationError:
+            continue
+    if not gifts:
+        raise ValueError("No valid gifts in JSON reply")
+    return gifts
+
+
+def _strip_fences(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    return text
+
+
+def parse_batch_json(text):
+    """Parse a batch reply into {index: [gift, ...]}; recipients with no valid gifts are left out"""
+    data = json.loads(_strip_fences(text))
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object keyed by recipient number")
+    results = {}
+    for key, items in data.items():
+        try:
+            index = int(str(key).lstrip("#"))
+            results[index] = parse_gifts_json(json.dumps(items))
+        except ValueError:
+            continue
+    return results
+
+
+def parse_gifts(text, structured=True):
+    """Return (gifts, parser) where parser is 'json' or 'text'"""
+    if structured:
+        try:
+            return parse_gifts_json(text), "json"
+        except ValueError:
+            # json.JSONDecodeError is a ValueError too
+            pass
+    return parse_gifts_text(text), "text"
+
+
+def _name_key(gift):
+    return re.sub(r"[^a-z0-9]+", " ", gift["name"].lower()).strip()
+
+
+def dedupe(gifts):
+    """Drop gifts whose name repeats an earlier one (ignoring case and punctuation)"""
+    seen = set()
+    unique = []
+    for gift in gifts:
+        key = _name_key(gift)
+        if key not in seen:
+            seen.add(key)
+            unique.append(gift)
+    return unique
+
+
+def fill_defaults(gifts, request):
+    """Ensure all gifts have required fields"""
+    symbol = currency_symbol(request.currency)
+    for gift in gifts:
+        gift.setdefault('description', 'A thoughtful gift')
+        gift.setdefault('reason', 'Perfect for them')
+        gift.setdefault('price_range', f"{symbol}{request.budget_min or 20}-{symbol}{request.budget_max or 100}")
+        gift.setdefault('where_to_buy', 'Online or local stores')
+    return gifts
+
+
+async def generate_gift_list(request, count=3, route="generate-gifts"):
+    """One model call for one recipient; returns (gifts, parser)"""
+    with metrics.stage("prompt", route):
+        prompt = structured_prompt(request, count) if GIFT_STRUCTURED_OUTPUT else text_prompt(request, count)
+    if GIFT_STRUCTURED_OUTPUT:
+        text = await llm.generate_text(prompt, route=route, generation_config=JSON_GENERATION_CONFIG)
+    else:
+        text = await llm.generate_text(prompt, route=route)
+    with metrics.stage("response_parse", route):
+        gifts, parser = parse_gifts(text, structured=GIFT_STRUCTURED_OUTPUT)
+        return fill_defaults(dedupe(gifts), request)[:count], parser
@@ -0,0 +1,287 @@
+"""
+Background jobs for long generations: submit now, poll for the result.
+
+POST /jobs/<kind> stores the request and returns a job id straight away;
+a fixed pool of JOB_WORKERS tasks runs queued jobs, premium lane first,
+and GET /jobs/{id} reports the status and, once done, the same result the
+synchronous endpoint would have returned.
+
+Job state lives in a store: in memory by default, or in SQLite with
+JOB_STORE=sqlite. With SQLite, status is visible to every uvicorn worker
+and jobs still queued when a process stopped are picked up again on the
+next start (a worker claims a job atomically, so it runs once). In memory,
+jobs queued or cancelled when the workers stop run after the next start().
+
+Jobs' model calls wait in the admission gates' background lane
+(admission.background), so a busy route delays a job instead of failing it.
+
+Handlers are registered per kind and take the stored JSON payload, so a
+job never holds on to live request objects.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+import admission
+import metrics
+import storage
+from logs import get_logger
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))  # queued jobs before submits are refused
+JOB_TTL = int(os.getenv("JOB_TTL_SECONDS", "3600"))  # finished jobs are kept this long
+JOB_STORE = os.getenv("JOB_STORE", "memory")  # memory | sqlite
+
+# Lower runs first
+LANES = {"premium": 0, "free": 1}
+
+log = get_logger("jobs")
+
+job_wait_seconds = metrics.Histogram("job_wait_seconds", "Time a job spent queued before a worker took it",
+                                     ("kind", "lane"))
+job_run_seconds = metrics.Histogram("job_run_seconds", "Time a worker spent running a job", ("kind",))
+jobs_total = metrics.Counter("jobs_total", "Finished jobs by kind and outcome", ("kind", "status"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobNotFound(KeyError):
+    pass
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+
+    def create(self, job):
+        self._jobs[job["job_id"]] = dict(job)
+
+    def update(self, job_id, **fields):
+        self._jobs[job_id].update(fields)
+
+    def claim(self, job_id, started_at):
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != "queued":
+            return False
+        job.update(status="running", started_at=started_at)
+        return True
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return dict(job)
+
+    def unfinished(self):
+        """Jobs still queued when the workers last stopped, oldest first"""
+        return sorted((dict(job) for job in self._jobs.values() if job["status"] == "queued"),
+                      key=lambda job: job["created_at"])
+
+    def purge(self, before):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < before]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        lane TEXT NOT NULL,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+    """
+    _JSON_FIELDS = ("payload", "result")
+
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = storage.connect(self.path)
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def _encode(self, field, value):
+        return json.dumps(value) if field in self._JSON_FIELDS and value is not None else value
+
+    def create(self, job):
+        fields = {("id" if k == "job_id" else k): self._encode(k, v) for k, v in job.items()}
+        with self._lock:
+            self.conn.execute(
+                f"INSERT INTO jobs ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})",
+                list(fields.values()),
+            )
+
+    def update(self, job_id, **fields):
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?",
+                              [self._encode(k, v) for k, v in fields.items()] + [job_id])
+
+    def claim(self, job_id, started_at):
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                (started_at, job_id),
+            )
+        return cursor.rowcount == 1
+
+    def _row(self, cursor, row):
+        job = {("job_id" if col[0] == "id" else col[0]): value for col, value in zip(cursor.description, row)}
+        for field in self._JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return self._row(cursor, row)
+
+    def unfinished(self):
+        """Jobs left queued by a previous process, oldest first"""
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at")
+            return [self._row(cursor, row) for row in cursor.fetchall()]
+
+    def purge(self, before):
+        with self._lock:
+            self.conn.execute("DELETE FROM jobs WHERE finished_at < ?", (before,))
+
+
+class JobQueue:
+    def __init__(self, store=None, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE):
+        self.store = store or (SQLiteJobStore() if JOB_STORE == "sqlite" else MemoryJobStore())
+        self.workers = workers
+        self.max_queued = max_queued
+        self.handlers = {}
+        self.depth = {lane: 0 for lane in LANES}
+        self.running = 0
+        self._queue = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._last_purge = 0.0
+
+    def register(self, kind, handler):
+        """handler(payload) -> awaitable JSON-able result"""
+        self.handlers[kind] = handler
+
+    def _enqueue(self, job):
+        self.depth[job["lane"]] += 1
+        self._queue.put_nowait((LANES[job["lane"]], next(self._seq), job["job_id"], job["kind"], job["created_at"]))
+
+    def submit(self, kind, payload, premium=False):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job workers are not running")
+        if sum(self.depth.values()) >= self.max_queued:
+            raise QueueFull()
+        self._purge()
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "lane": "premium" if premium else "free",
+            "status": "queued",
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.store.create(job)
+        self._enqueue(job)
+        return job
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        job.pop("payload", None)
+        return job
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            self.store.purge(now - JOB_TTL)
+
+    async def _work(self):
+        while True:
+            rank, _, job_id, kind, created_at = await self._queue.get()
+            lane = next(name for name, value in LANES.items() if value == rank)
+            self.depth[lane] -= 1
+            started = time.time()
+            if not self.store.claim(job_id, started):
+                continue  # another process got to it first
+            job = self.store.get(job_id)
+            self.running += 1
+            job_wait_seconds.observe(started - created_at, kind=kind, lane=lane)
+            try:
+                # Model calls wait in the gate's background lane instead of failing when it is busy
+                with admission.background():
+                    result = await self.handlers[kind](job["payload"])
+            except asyncio.CancelledError:
+                # Shutting down: requeued for the next start() (the next process, with SQLite)
+                self.store.update(job_id, status="queued", started_at=None)
+                raise
+            except Exception as e:
+                status = "failed"
+                self.store.update(job_id, status=status, error=str(e) or type(e).__name__, finished_at=time.time())
+                log.warning("job_failed", job_id=job_id, kind=kind, error=str(e))
+            else:
+                status = "done"
+                self.store.update(job_id, status=status, result=result, finished_at=time.time())
+            finally:
+                self.running -= 1
+            jobs_total.inc(kind=kind, status=status)
+            job_run_seconds.observe(time.time() - started, kind=kind)
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self.depth = {lane: 0 for lane in LANES}
+        for job in self.store.unfinished():
+            if job["kind"] in self.handlers:
+                self._enqueue(job)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+job_queue = JobQueue()
+
+
+def _collect():
+    yield ("job_queue_depth", "gauge", "Jobs waiting for a worker, per lane",
+           [({"lane": lane}, depth) for lane, depth in job_queue.depth.items()])
+    yield "jobs_running", "gauge", "Jobs being run right now", [({}, job_queue.running)]
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,103 @@
+"""
+Size limits for request fields and prompts.
+
+Two layers keep one oversized payload from inflating a model call:
+
+Validation. Free-text fields that go into a prompt are typed with the
+Annotated strings below and are clipped to their character limit while the
+request is parsed, at a word boundary with a trailing "…". Interests keep
+their first MAX_INTERESTS entries. Lists where dropping entries would change
+the answer (Secret Santa names, budget items, wishlist items) are rejected
+above their cap with a 422 instead; their entries never reach a prompt, so
+they are left as sent.
+
+Prompts. Each template has a token budget (PROMPT_TOKEN_BUDGETS, override
+with PROMPT_BUDGET_<TEMPLATE>, e.g. PROMPT_BUDGET_WISHLIST=800). The prompt
+is estimated before the model is called, and if it is over budget its
+trimmable fields are clipped in a fixed order until it fits
+(prompts.Template.render), so the same request always gives the same prompt.
+
+Both layers count what they cut (input_trimmed_*, prompt_trimmed_* on
+/metrics and per template on /prompt-stats) so limits can be tuned against
+latency.
+"""
+import os
+from typing import Annotated, List
+
+from pydantic import AfterValidator, BeforeValidator, ValidationInfo
+
+import llm
+import metrics
+
+NAME_CHARS = int(os.getenv("LIMIT_NAME_CHARS", "80"))
+SHORT_CHARS = int(os.getenv("LIMIT_SHORT_CHARS", "120"))
+TEXT_CHARS = int(os.getenv("LIMIT_TEXT_CHARS", "500"))
+ITEM_CHARS = int(os.getenv("LIMIT_ITEM_CHARS", "200"))
+INTEREST_CHARS = int(os.getenv("LIMIT_INTEREST_CHARS", "60"))
+MAX_INTERESTS = int(os.getenv("LIMIT_INTERESTS", "10"))
+MAX_WISHLIST_ITEMS = int(os.getenv("LIMIT_WISHLIST_ITEMS", "100"))
+MAX_SANTA_NAMES = int(os.getenv("LIMIT_SANTA_NAMES", "10000"))
+MAX_BUDGET_ITEMS = int(os.getenv("LIMIT_BUDGET_ITEMS", "10000"))
+
+# Estimated input tokens per rendered prompt; 0 = unlimited
+PROMPT_TOKEN_BUDGETS = {
+    name: int(os.getenv(f"PROMPT_BUDGET_{name.upper().replace('-', '_')}", str(default)))
+    for name, default in {
+        "party-plan": 300,
+        "wishlist": 500,
+        "photo-caption": 200,
+        "card": 250,
+        "message": 200,
+        "gifts-text": 300,
+        "gifts-structured": 250,
+    }.items()
+}
+# A trimmed prompt field keeps at least this much of its text
+PROMPT_MIN_FIELD_CHARS = 40
+
+input_trimmed = metrics.Counter("input_trimmed_total", "Request fields clipped at validation", ("field",))
+input_trimmed_tokens = metrics.Counter("input_trimmed_tokens_total",
+                                       "Estimated tokens removed from request fields at validation", ("field",))
+
+
+def clip(text, limit):
+    """text cut to at most `limit` characters, at a word boundary if one is close, ending in …"""
+    if len(text) <= limit:
+        return text
+    cut = text[:max(limit - 1, 0)]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;") + "…"
+
+
+def _count(field, before, after):
+    input_trimmed.inc(field=field)
+    input_trimmed_tokens.inc(llm.estimate_tokens(before) - llm.estimate_tokens(after), field=field)
+
+
+def _clipper(limit):
+    def validate(value, info: ValidationInfo):
+        clipped = clip(value, limit)
+        if clipped is not value:
+            _count(info.field_name, value, clipped)
+        return clipped
+    return validate
+
+
+def _first(limit):
+    # Runs before the entries are validated, so dropped ones aren't clipped (and counted) first
+    def validate(values, info: ValidationInfo):
+        if not isinstance(values, list) or len(values) <= limit:
+            return values
+        _count(info.field_name, ", ".join(map(str, values)), ", ".join(map(str, values[:limit])))
+        return values[:limit]
+    return validate
+
+
+Name = Annotated[str, AfterValidator(_clipper(NAME_CHARS))]
+ShortText = Annotated[str, AfterValidator(_clipper(SHORT_CHARS))]
+LongText = Annotated[str, AfterValidator(_clipper(TEXT_CHARS))]
+ItemText = Annotated[str, AfterValidator(_clipper(ITEM_CHARS))]
+Interests = Annotated[List[Annotated[str, AfterValidator(_clipper(INTEREST_CHARS))]],
+                      BeforeValidator(_first(MAX_INTERESTS))]
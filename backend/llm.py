@@ -0,0 +1,424 @@
+"""
+Shared async client for Gemini calls.
+
+Every handler goes through generate_text() instead of calling
+model.generate_content() directly, so a slow generation never blocks the
+event loop. LLM_CONCURRENCY caps how many upstream calls one worker keeps
+in flight at a time.
+
+Concurrent calls with the same prompt, model and options are coalesced: the first
+caller makes the upstream request and the others await its result.
+Failures are handed to every waiter but never remembered, so the next
+call retries upstream.
+
+Each call runs under its route's deadline, is retried on transient errors
+and goes through a circuit breaker (see resilience.py). Calls that would
+go upstream first need a slot from the route's admission gate
+(admission.py); premium callers pass premium=True.
+
+Models are created with the shared system instruction from prompts.py.
+The model and generation config come from the routing table
+(model_routing.py). If the primary model fails (breaker open, retries
+used up, model errors) the route's fallback model gets the rest of the
+deadline. Each model has its own circuit breaker.
+
+google.generativeai (grpc, protobuf) is only imported when a model is
+first needed, so routes that never call it don't pay for it on a cold
+start. With LLM_WARMUP=1 the app loads it in a background thread right
+after startup instead.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import admission
+import metrics
+from logs import get_logger
+from model_routing import RoutingTable
+from resilience import (LLM_HEDGE, LLM_MAX_RETRIES, CircuitBreaker, LatencyTracker, LLMUnavailable,
+                        backoff_delay, deadline_for, first_success, is_retryable)
+
+MODEL_NAME = 'models/gemini-2.5-flash'  # used for routes missing from the routing table
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | fake
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+
+log = get_logger("llm")
+
+routes = RoutingTable(MODEL_NAME)
+
+# Model objects by name, created on first use, see get_model()
+models = {}
+# Set by use_model(): one model object serving every route (benchmarks)
+_pinned = None
+_genai = None
+_model_lock = threading.RLock()
+
+call_seconds = metrics.Histogram("llm_call_seconds", "Single upstream model call", ("route", "model", "outcome"))
+
+
+def genai_client():
+    """The google.generativeai module, imported and configured once"""
+    global _genai
+    with _model_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _genai = genai
+    return _genai
+
+
+def create_model(name=MODEL_NAME, backend=None):
+    """Model object for the configured backend; 'fake' replays recorded responses offline"""
+    backend = backend or LLM_BACKEND
+    if backend == "fake":
+        from fake_model import ReplayModel
+        return ReplayModel.from_env(model_name=f"models/fake-{name.rsplit('/', 1)[-1]}")
+    if backend == "gemini":
+        from prompts import SYSTEM_INSTRUCTION
+        return genai_client().GenerativeModel(name, system_instruction=SYSTEM_INSTRUCTION)
+    raise ValueError(f"Unknown LLM_BACKEND: {backend!r}")
+
+
+def use_model(model_object):
+    """Serve every route with this one model object (None goes back to the routing table)"""
+    global _pinned
+    _pinned = model_object
+
+
+def get_model(name=MODEL_NAME):
+    if _pinned is not None:
+        return _pinned
+    found = models.get(name)
+    if found is None:
+        with _model_lock:
+            found = models.get(name)
+            if found is None:
+                found = models[name] = create_model(name)
+    return found
+
+
+async def ensure_model(name=MODEL_NAME):
+    """get_model() without blocking the event loop on the first (slow) import"""
+    if _pinned is not None or name in models:
+        return get_model(name)
+    return await asyncio.get_running_loop().run_in_executor(None, get_model, name)
+
+
+def model_name(name=MODEL_NAME):
+    """Name reported in metrics for a configured model (the fake backend's own name when faked)"""
+    return getattr(_pinned or models.get(name), "model_name", name)
+
+
+def route_model_name(route):
+    """Name of the model serving a route first"""
+    return model_name(routes.resolve(route).primary.model)
+
+
+async def warm_up():
+    try:
+        for name in routes.model_names():
+            await ensure_model(name)
+        log.info("llm_ready", backend=LLM_BACKEND, models=routes.model_names())
+    except Exception as e:
+        # The first request will try again and report the error properly
+        log.warning("llm_warmup_failed", error=str(e))
+
+
+_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+# Only used for model objects without an async API
+_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+
+# Model name -> its circuit breaker
+breakers = {}
+latencies = LatencyTracker()
+
+# (model name, prompt, options) -> task of the call currently in flight
+_inflight = {}
+stats = {"upstream_calls": 0, "coalesced_calls": 0, "errors": 0, "retries": 0, "hedged_calls": 0,
+         "timeouts": 0, "breaker_rejections": 0, "fallbacks": 0}
+
+
+def breaker_for(name):
+    found = breakers.get(name)
+    if found is None:
+        found = breakers[name] = CircuitBreaker()
+    return found
+
+
+def _collect():
+    for key, value in stats.items():
+        yield f"llm_{key}_total", "counter", f"LLM layer {key.replace('_', ' ')}", [({}, value)]
+    yield "llm_in_flight", "gauge", "Distinct upstream generations in flight", [({}, len(_inflight))]
+    yield ("llm_breaker_open", "gauge", "1 while a model's circuit breaker is rejecting calls",
+           [({"model": name}, int(b.state == "open")) for name, b in breakers.items()])
+
+
+metrics.register_collector(_collect)
+
+
+def estimate_tokens(text):
+    """Rough token count for Gemini models (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _record_tokens(route, model_label, prompt, response=None, text=None):
+    """Token counters from the model's usage report, or estimated from the text"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if output_tokens is None:
+        output_tokens = estimate_tokens(text if text is not None else response.text)
+    labels = {"route": route or "unknown", "model": model_label}
+    metrics.llm_tokens.inc(prompt_tokens, kind="prompt", **labels)
+    metrics.llm_tokens.inc(output_tokens, kind="output", **labels)
+
+
+def _options(target, kwargs):
+    """Route's generation config, overridden by anything the caller passed"""
+    config = {**target.generation_config, **(kwargs.get("generation_config") or {})}
+    return {**kwargs, "generation_config": config} if config else kwargs
+
+
+async def _call_model(model, prompt, **kwargs):
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: model.generate_content(prompt, **kwargs))
+
+
+def _check_breaker(breaker):
+    try:
+        breaker.before_call()
+    except LLMUnavailable:
+        stats["breaker_rejections"] += 1
+        raise
+
+
+def _record_error(breaker, error):
+    if is_retryable(error):
+        breaker.record_failure()
+    else:
+        # Upstream answered, it just didn't like the request
+        breaker.record_success()
+
+
+def _can_fall_back(error, targets, index):
+    """Fall back unless this was the last model or the deadline is gone"""
+    if index == len(targets) - 1:
+        return False
+    return not (isinstance(error, LLMUnavailable) and error.status_code == 504)
+
+
+async def stream_text(prompt, route=None, premium=False, **kwargs):
+    """Yield text chunks as the model produces them"""
+    route_models = routes.resolve(route)
+    targets = [t for t in (route_models.primary, route_models.fallback) if t is not None]
+    await ensure_model(targets[0].model)
+    route_gate = admission.gate(route)
+    granted_at = await route_gate.acquire(premium)
+    try:
+        for index, target in enumerate(targets):
+            await ensure_model(target.model)
+            started = False
+            try:
+                async for chunk in _stream_upstream(prompt, route, target, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Once text has gone out a second model can't take over
+                if started or not _can_fall_back(e, targets, index):
+                    raise
+                stats["fallbacks"] += 1
+                log.warning("llm_fallback", model=target.model, error=str(e))
+    finally:
+        route_gate.release(granted_at)
+
+
+async def _stream_upstream(prompt, route, target, **kwargs):
+    """Relay the model's chunks; the upstream read runs as its own task, so a slow client never holds a slot"""
+    queue = asyncio.Queue()
+    reader = asyncio.ensure_future(_read_upstream(prompt, route, target, queue, **kwargs))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        await reader
+    finally:
+        if not reader.done():
+            # Client gone (GeneratorExit) or request cancelled: stop reading upstream
+            reader.cancel()
+        elif not reader.cancelled():
+            reader.exception()  # retrieved, so a failure after the client left isn't reported as unhandled
+
+
+async def _read_upstream(prompt, route, target, queue, **kwargs):
+    """Read one upstream stream into `queue` at the model's pace, ending with None"""
+    model = get_model(target.model)
+    label = model_name(target.model)
+    breaker = breaker_for(target.model)
+    kwargs = _options(target, kwargs)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + deadline_for(route)
+    produced = []
+    response = None
+    settled = False
+    try:
+        _check_breaker(breaker)
+        async with _semaphore:
+            stats["upstream_calls"] += 1
+            if not hasattr(model, "generate_content_async"):
+                # No async streaming API: hand back the whole answer as one chunk
+                response = await asyncio.wait_for(_call_model(model, prompt, **kwargs), deadline - loop.time())
+                produced.append(response.text)
+                queue.put_nowait(response.text)
+            else:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(prompt, stream=True, **kwargs), deadline - loop.time())
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    response = chunk
+                    if chunk.text:
+                        produced.append(chunk.text)
+                        queue.put_nowait(chunk.text)
+        settled = True
+    except LLMUnavailable:
+        # Rejected by the breaker, which has nothing to record
+        settled = True
+        raise
+    except asyncio.TimeoutError:
+        settled = True
+        stats["timeouts"] += 1
+        breaker.record_failure()
+        call_seconds.observe(loop.time() - started, route=route, model=label, outcome="timeout")
+        raise LLMUnavailable("AI service took too long to respond", status_code=504)
+    except Exception as e:
+        settled = True
+        stats["errors"] += 1
+        _record_error(breaker, e)
+        call_seconds.observe(loop.time() - started, route=route, model=label, outcome="error")
+        raise
+    finally:
+        queue.put_nowait(None)
+        if not settled:
+            # Cancelled before upstream answered: don't leave a half-open probe claimed
+            breaker.abort()
+    breaker.record_success()
+    call_seconds.observe(loop.time() - started, route=route, model=label, outcome="ok")
+    # Streaming responses report usage on the last chunk, if at all
+    _record_tokens(route, label, prompt, response, "".join(produced))
+    metrics.observe_stage("upstream", loop.time() - started, route, label)
+
+
+async def _generate_upstream(prompt, route, model, label, **kwargs):
+    stats["upstream_calls"] += 1
+    async with _semaphore:
+        started = time.perf_counter()
+        try:
+            response = await _call_model(model, prompt, **kwargs)
+        except Exception:
+            call_seconds.observe(time.perf_counter() - started, route=route, model=label, outcome="error")
+            raise
+    call_seconds.observe(time.perf_counter() - started, route=route, model=label, outcome="ok")
+    _record_tokens(route, label, prompt, response)
+    return response.text
+
+
+def _count_hedge():
+    stats["hedged_calls"] += 1
+
+
+async def _generate_with_retries(prompt, route, target, deadline, **kwargs):
+    """Deadline, retries with jittered backoff, circuit breaker and optional hedging, for one model"""
+    loop = asyncio.get_running_loop()
+    model = await ensure_model(target.model)
+    label = model_name(target.model)
+    breaker = breaker_for(target.model)
+    kwargs = _options(target, kwargs)
+    attempt = 0
+    while True:
+        _check_breaker(breaker)
+        started = loop.time()
+        hedge_after = latencies.percentile(route, 95) if LLM_HEDGE else None
+        try:
+            text = await first_success(lambda: _generate_upstream(prompt, route, model, label, **kwargs),
+                                       deadline - started, hedge_after, on_hedge=_count_hedge)
+        except asyncio.CancelledError:
+            breaker.abort()
+            raise
+        except Exception as e:
+            _record_error(breaker, e)
+            if isinstance(e, asyncio.TimeoutError):
+                stats["timeouts"] += 1
+                raise LLMUnavailable("AI service took too long to respond", status_code=504) from e
+            if not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            if attempt >= LLM_MAX_RETRIES or loop.time() + delay >= deadline:
+                raise LLMUnavailable("AI service is temporarily unavailable, please retry shortly") from e
+            stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        latencies.record(route, loop.time() - started)
+        return text
+
+
+async def _generate_resilient(prompt, route, **kwargs):
+    """Primary model, then the fallback within what is left of the route's deadline"""
+    route_models = routes.resolve(route)
+    targets = [t for t in (route_models.primary, route_models.fallback) if t is not None]
+    deadline = asyncio.get_running_loop().time() + deadline_for(route)
+    for index, target in enumerate(targets):
+        try:
+            return await _generate_with_retries(prompt, route, target, deadline, **kwargs)
+        except Exception as e:
+            if not _can_fall_back(e, targets, index):
+                raise
+            stats["fallbacks"] += 1
+            log.warning("llm_fallback", model=target.model, error=str(e))
+
+
+def _finish(key, task):
+    _inflight.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        stats["errors"] += 1
+
+
+async def generate_text(prompt, route=None, premium=False, **kwargs):
+    """Run one generation without blocking the event loop and return its text"""
+    kwargs = {k: v for k, v in kwargs.items() if v is not None}
+    primary = routes.resolve(route).primary
+    await ensure_model(primary.model)
+    key = (model_name(primary.model), prompt, json.dumps(_options(primary, kwargs), sort_keys=True, default=str))
+    task = _inflight.get(key)
+    if task is None:
+        route_gate = admission.gate(route)
+        granted_at = await route_gate.acquire(premium)
+        # Someone may have started the same call while we waited for the slot
+        task = _inflight.get(key)
+        if task is not None:
+            route_gate.release(None)
+    if task is not None:
+        stats["coalesced_calls"] += 1
+    else:
+        # The upstream call runs as its own task so a disconnecting caller
+        # doesn't cancel it for everyone else waiting on the same prompt
+        task = asyncio.ensure_future(_generate_resilient(prompt, route, **kwargs))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finish(key, t))
+        task.add_done_callback(lambda t: route_gate.release(granted_at))
+    with metrics.stage("upstream", route or "unknown", key[0]):
+        return await asyncio.shield(task)
@@ -0,0 +1,104 @@
+"""
+Structured, non-blocking logging.
+
+Handlers log through get_logger(name) and pass fields as keyword arguments:
+
+    log.info("gift_request", recipient=name, interests=len(interests))
+
+Records are put on a bounded queue and written as JSON lines by a background
+thread, so a slow stdout never stalls the event loop. If the queue is full
+the record is dropped and counted instead of blocking. Info/debug records
+are sampled with LOG_SAMPLE_RATE (0..1); warnings and errors are always kept.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+dropped_logs = metrics.Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_logs.inc()
+
+    def prepare(self, record):
+        # Resolve everything that depends on the caller here: the message
+        # args, the traceback and the route of the request being handled
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.route = metrics.current_route()
+        if record.exc_info:
+            record.fields = {**getattr(record, "fields", {}), "exc": _formatter.formatException(record.exc_info)}
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+
+class FieldsAdapter(logging.LoggerAdapter):
+    """logger.info("event", key=value, ...) -> record.fields"""
+
+    def process(self, msg, kwargs):
+        passthrough = {k: kwargs.pop(k) for k in ("exc_info", "stack_info", "stacklevel") if k in kwargs}
+        return msg, {**passthrough, "extra": {"fields": kwargs}}
+
+
+_formatter = logging.Formatter()
+_queue = queue.Queue(LOG_QUEUE_SIZE)
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(JSONFormatter())
+_listener = logging.handlers.QueueListener(_queue, _stream_handler)
+
+_root = logging.getLogger("genie")
+_root.setLevel(LOG_LEVEL)
+_root.propagate = False
+_queue_handler = DroppingQueueHandler(_queue)
+_queue_handler.addFilter(SampleFilter(LOG_SAMPLE_RATE))
+_root.addHandler(_queue_handler)
+
+_listener.start()
+atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    return FieldsAdapter(logging.getLogger(f"genie.{name}"), {})
@@ -1,17 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from pathlib import Path
-import google.generativeai as genai
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
 import os
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Dict, List, Optional
 import warnings
-from datetime import datetime
-import random
-import uuid
+from contextlib import asynccontextmanager
+import llm
+import metrics
+import prompts
+from logs import get_logger
+from resilience import LLMUnavailable
+import static_assets
+from api_responses import JSONResponse, CompressionMiddleware
+from streaming import sse_response, sse_event, single_chunk, SSE_HEADERS
+from gifts import Gift, generate_gift_list
+from gift_catalog import gift_catalog, catalog_suggestions
+from gift_pages import GIFT_PAGE_SIZE, CursorExpired, clamp_pages, first_page, next_page
+from gift_batch import generate_batch, MAX_BATCH_SIZE
+from secret_santa import assign_secret_santa, NoValidAssignment
+from budget import BudgetAggregator, BudgetParseError, iter_lines, load_csv, load_ndjson
+from budget_store import budget_store, SessionNotFound, ItemNotFound
+from quota import quota_store, client_id
+from wishlist_store import wishlist_store, WishlistNotFound
+from jobs import job_queue, QueueFull, JobNotFound
+from warmer import warmer
+from limits import (Name, ShortText, LongText, ItemText, Interests,
+                    MAX_BUDGET_ITEMS, MAX_SANTA_NAMES, MAX_WISHLIST_ITEMS)
+from cache import response_cache, cache_directives, gift_cache_key, caption_cache_key, card_cache_key, message_cache_key
 
 # Suppress deprecation warning
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -19,11 +38,26 @@ warnings.filterwarnings('ignore', category=FutureWarning)
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel('models/gemini-2.5-flash')
-
-app = FastAPI(title="🎄 AI Christmas Gift Generator", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    # Read and precompress the frontend once instead of on every hit to /
+    static_assets.load()
+    gift_catalog.load()
+    prompts.check()
+    # Gemini is configured lazily; warm it up in the background so startup
+    # (and non-AI routes) don't wait for the google.generativeai import
+    if llm.LLM_WARMUP:
+        app.state.llm_warmup = asyncio.create_task(llm.warm_up())
+    await job_queue.start()
+    await warmer.start()
+    yield
+    await warmer.stop()
+    await job_queue.stop()
+
+# Wrapped in Default() so routes with a response_model still get FastAPI's
+# direct Pydantic-to-bytes serialization; the rest render with orjson
+app = FastAPI(title="🎄 AI Christmas Gift Generator", version="1.0.0", lifespan=lifespan,
+              default_response_class=Default(JSONResponse))
 
 # CORS middleware
 app.add_middleware(
@@ -33,91 +67,198 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so request timing covers everything below it
+app.add_middleware(metrics.MetricsMiddleware)
+
+log = get_logger("api")
 
+# Free-text fields that go into prompts are clipped to their limits.py size while parsing
 class GiftRequest(BaseModel):
-    recipient_name: str
+    recipient_name: Name
     age: Optional[int] = None
-    gender: Optional[str] = None
-    relationship: str
-    interests: List[str] = []
+    gender: Optional[ShortText] = None
+    relationship: ShortText
+    interests: Interests = []
     budget_min: Optional[float] = None
     budget_max: Optional[float] = None
-    occasion: str = "Christmas"
-    personality: Optional[str] = None
-    special_notes: Optional[str] = None
-    location: Optional[str] = None
+    occasion: ShortText = "Christmas"
+    personality: Optional[ShortText] = None
+    special_notes: Optional[LongText] = None
+    location: Optional[ShortText] = None
     currency: str = "USD"
 
+class GiftBatchRequest(BaseModel):
+    requests: List[GiftRequest] = Field(max_length=MAX_BATCH_SIZE)
+
 class MessageRequest(BaseModel):
-    recipient_name: str
-    relationship: str
-    occasion: str = "Christmas"
-    tone: str = "warm"
-    gift_context: Optional[str] = None
-    special_message: Optional[str] = None
+    recipient_name: Name
+    relationship: ShortText
+    occasion: ShortText = "Christmas"
+    tone: ShortText = "warm"
+    gift_context: Optional[LongText] = None
+    special_message: Optional[LongText] = None
     is_premium: bool = False
 
 class SecretSantaRequest(BaseModel):
-    names: List[str]
+    names: List[str] = Field(max_length=MAX_SANTA_NAMES)  # never prompted, so only the count is capped
     exclude_pairs: Optional[List[List[str]]] = None  # [["John", "Jane"]] means John can't be Jane's Santa
+    seed: Optional[int] = None  # same seed + same names = same draw
 
 class PartyPlannerRequest(BaseModel):
-    occasion: str  # Christmas, New Year, Birthday, etc.
+    occasion: ShortText  # Christmas, New Year, Birthday, etc.
     guest_count: int
     budget: Optional[float] = None
-    venue_type: str  # home, restaurant, outdoor, etc.
-    theme: Optional[str] = None
-    dietary_restrictions: Optional[str] = None
-    age_group: str  # kids, adults, mixed, seniors
+    venue_type: ShortText  # home, restaurant, outdoor, etc.
+    theme: Optional[ShortText] = None
+    dietary_restrictions: Optional[LongText] = None
+    age_group: ShortText  # kids, adults, mixed, seniors
+    is_premium: bool = False  # premium background jobs run ahead of free ones
 
 class BudgetItem(BaseModel):
     name: str
     category: str  # gifts, food, decorations, etc.
-    planned_amount: float
-    actual_amount: Optional[float] = None
+    planned_amount: float = Field(allow_inf_nan=False)
+    actual_amount: Optional[float] = Field(default=None, allow_inf_nan=False)
     recipient: Optional[str] = None
 
 class BudgetRequest(BaseModel):
-    total_budget: float
+    total_budget: float = Field(allow_inf_nan=False)
     currency: str = "USD"
-    items: List[BudgetItem] = []
+    items: List[BudgetItem] = Field(default=[], max_length=MAX_BUDGET_ITEMS)
 
 class WishlistRequest(BaseModel):
-    title: str
-    items: List[str]
-    occasion: str
+    title: ShortText
+    items: List[ItemText] = Field(max_length=MAX_WISHLIST_ITEMS)
+    occasion: ShortText
     privacy: str = "public"  # public, private, friends
 
 class CaptionRequest(BaseModel):
-    photo_description: str
-    occasion: str
-    tone: str = "fun"  # fun, heartfelt, funny, elegant
+    photo_description: LongText
+    occasion: ShortText
+    tone: ShortText = "fun"  # fun, heartfelt, funny, elegant
     hashtags: bool = True
 
 class WishlistRequest(BaseModel):
-    title: str
-    items: List[str]
-    occasion: str = "Christmas"
-    recipient_name: str
+    title: ShortText
+    items: List[ItemText] = Field(max_length=MAX_WISHLIST_ITEMS)
+    occasion: ShortText = "Christmas"
+    recipient_name: Name
     privacy: str = "public"  # public, private, friends
+    is_premium: bool = False  # premium background jobs run ahead of free ones
 
 class CardRequest(BaseModel):
-    occasion: str  # Christmas, New Year, Birthday, etc.
-    recipient_name: str
-    sender_name: str
-    relationship: str
-    tone: str = "warm"  # warm, funny, formal, heartfelt
-    custom_message: Optional[str] = None
-    card_style: str = "classic"  # classic, modern, cute, elegant
-
-# Track free message usage (in production, use database)
-free_messages_used = 0
+    occasion: ShortText  # Christmas, New Year, Birthday, etc.
+    recipient_name: Name
+    sender_name: Name
+    relationship: ShortText
+    tone: ShortText = "warm"  # warm, funny, formal, heartfelt
+    custom_message: Optional[LongText] = None
+    card_style: ShortText = "classic"  # classic, modern, cute, elegant
+
+# Response models: FastAPI serializes these straight to JSON bytes. Routes that
+# leave some fields out use response_model_exclude_unset so absent stays absent.
+class GiftPage(BaseModel):
+    gifts: List[Gift]
+    recipient: str
+    source: str  # llm or catalog
+    page: int
+    next_cursor: Optional[str] = None
+
+class BudgetItemOut(BaseModel):
+    name: str
+    category: str
+    planned_amount: float
+    actual_amount: Optional[float] = None
+    recipient: Optional[str] = None
+    item_id: Optional[int] = None  # budget sessions only
+
+class CategoryTotals(BaseModel):
+    planned: float
+    actual: float
+    items: Optional[List[BudgetItemOut]] = None
+
+class Totals(BaseModel):
+    planned: float
+    actual: float
+
+class BudgetResponse(BaseModel):
+    session_id: Optional[str] = None
+    item_id: Optional[int] = None
+    total_budget: float
+    total_planned: float
+    total_spent: float
+    remaining: float
+    categories: Dict[str, CategoryTotals]
+    currency: str
+    over_budget: bool
+    item_count: Optional[int] = None  # bulk uploads
+    recipients: Optional[Dict[str, Totals]] = None
+
+class PartyPlanResponse(BaseModel):
+    party_plan: str
+    occasion: str
+    guests: int
+
+class WishlistResponse(BaseModel):
+    wishlist_id: str
+    title: str
+    items: List[str]
+    recipient: str
+    occasion: str
+    share_url: str
+    ai_suggestions: str
+
+class CaptionResponse(BaseModel):
+    caption: str
+    occasion: str
+
+class CardResponse(BaseModel):
+    card_content: str
+    occasion: str
+    style: str
+    recipient: str
+    sender: str
+
+class MessageResponse(BaseModel):
+    message: Optional[str]
+    recipient: str
+    is_sample: Optional[bool] = None
+    is_premium: Optional[bool] = None
+    requires_subscription: Optional[bool] = None
+    sample_messages: Optional[List[str]] = None
+    free_messages_used: Optional[int] = None
+    max_free_messages: Optional[int] = None
+
+class Assignment(BaseModel):
+    giver: str
+    receiver: str
+
+class SecretSantaResponse(BaseModel):
+    success: bool
+    assignments: List[Assignment]
+    total_participants: int
+
+# Free message allowance per client, tracked in the shared quota store
 MAX_FREE_MESSAGES = 3
+FREE_MESSAGES_WINDOW = int(os.getenv("FREE_MESSAGES_WINDOW_SECONDS", "0"))  # 0 = until reset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def upstream_error(e):
+    """HTTPException for a failed LLM handler: 429/503/504 with Retry-After for overload or upstream trouble, else 500"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, LLMUnavailable):
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+    return HTTPException(status_code=500, detail=str(e))
+
+def wishlist_share_url(wishlist_id):
+    return f"ai-gift-genie.onrender.com/wishlist/{wishlist_id}"
 
 # Sample messages for free users (dynamic year)
 def get_sample_messages():
-    current_year = datetime.now().year
-    next_year = current_year + 1
+    next_year = prompts.time_context().next_year
     return [
         f"Wishing you a Christmas filled with joy, laughter, and all the warmth of the season! May your holidays sparkle with happiness and your {next_year} be bright with new possibilities. 🎄✨",
         f"May this Christmas bring you peace, love, and countless moments of joy with those who matter most. Here's to a wonderful holiday season and an amazing {next_year} ahead! 🎅🎁",
@@ -129,272 +270,347 @@ async def root():
     return {"message": "🎄 AI Christmas Gift Generator API", "status": "running"}
 
 @app.get("/")
-async def serve_frontend():
-    frontend_path = Path(__file__).parent.parent / "frontend" / "genz.html"
-    if frontend_path.exists():
-        return FileResponse(frontend_path)
-    return {"error": "Frontend not found"}
+async def serve_frontend(http_request: Request):
+    asset = static_assets.get("genz.html")
+    if asset is None:
+        return {"error": "Frontend not found"}
+    return static_assets.asset_response(asset, http_request)
+
+@app.get("/app.js")
+async def serve_app_js(http_request: Request):
+    asset = static_assets.get("app.js")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return static_assets.asset_response(asset, http_request)
 
 @app.post("/reset-free-messages")
-async def reset_free_messages():
-    """Reset free message counter (for demo purposes)"""
-    global free_messages_used
-    free_messages_used = 0
-    return {"message": "Free messages reset", "free_messages_used": free_messages_used}
-
-@app.post("/party-planner")
-async def generate_party_plan(request: PartyPlannerRequest):
-    print(f"\n=== PARTY PLANNER REQUEST ===")
+async def reset_free_messages(http_request: Request, client: Optional[str] = None,
+                              x_admin_token: Optional[str] = Header(None)):
+    """Admin only: reset a client's free message counter (the caller's own without ?client=)"""
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+    if client is None:
+        client = client_id(http_request)
+    quota_store.reset("free-messages", client)
+    return {"message": "Free messages reset", "client": client, "free_messages_used": 0}
+
+def party_plan_prompt(request):
+    """Prompt for /party-planner and its background job"""
+    return prompts.PARTY_PLAN.render(
+        occasion=request.occasion, guest_count=request.guest_count,
+        budget=f"${request.budget}" if request.budget else "Flexible", venue_type=request.venue_type,
+        theme=request.theme or 'Classic', age_group=request.age_group,
+        dietary_restrictions=request.dietary_restrictions or 'None',
+    )
+
+def message_prompt(request):
+    """Prompt for /generate-message, free and premium"""
+    return prompts.MESSAGE.render(
+        tone=request.tone, occasion=request.occasion, recipient_name=request.recipient_name,
+        relationship=request.relationship, gift_context=request.gift_context or 'None',
+        special_message=request.special_message or 'None',
+    )
+
+def wishlist_prompt(request):
+    """Prompt for /create-wishlist and its background job"""
+    return prompts.WISHLIST.render(occasion=request.occasion, recipient_name=request.recipient_name,
+                                   items=', '.join(request.items))
+
+async def build_party_plan(request, prompt=None):
+    plan = (await llm.generate_text(prompt or party_plan_prompt(request), route="party-planner",
+                                     premium=request.is_premium)).strip()
+    return {"party_plan": plan, "occasion": request.occasion, "guests": request.guest_count}
+
+@app.post("/party-planner", response_model=PartyPlanResponse)
+@metrics.instrument("party-planner")
+async def generate_party_plan(request: PartyPlannerRequest, stream: bool = False):
+    log.info("party_plan_request", occasion=request.occasion, guests=request.guest_count, stream=stream)
     try:
-        current_year = datetime.now().year
-        next_year = current_year + 1
-        current_month = datetime.now().month
-        
-        if current_month == 12:
-            time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}."
-        elif current_month == 1:
-            time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
-        else:
-            time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
-        
-        prompt = f"""Create a comprehensive {request.occasion} party plan for {request.guest_count} guests.
-        
-Timing context: {time_context}
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}.
-        
-Details:
-        - Budget: ${request.budget or 'Flexible'}
-        - Venue: {request.venue_type}
-        - Theme: {request.theme or 'Classic'}
-        - Age group: {request.age_group}
-        - Dietary restrictions: {request.dietary_restrictions or 'None'}
+        with metrics.stage("prompt"):
+            prompt = party_plan_prompt(request)
         
-Provide:
-        1. Theme & Decorations (3-4 ideas)
-        2. Food & Drinks Menu (5-6 items)
-        3. Activities & Games (4-5 options)
-        4. Timeline (hour by hour)
-        5. Shopping List (essentials)
+        if stream:
+            meta = {"occasion": request.occasion, "guests": request.guest_count}
+            return sse_response(llm.stream_text(prompt, route="party-planner", premium=request.is_premium), meta, "party_plan")
         
-Make it creative, engaging, and budget-conscious. Format clearly with emojis."""
-        
-        response = model.generate_content(prompt)
-        plan = response.text.strip()
-        
-        return {"party_plan": plan, "occasion": request.occasion, "guests": request.guest_count}
+        return await build_party_plan(request, prompt)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
-@app.post("/budget-tracker")
+@app.post("/budget-tracker", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-tracker")
 async def track_budget(request: BudgetRequest):
     try:
-        total_planned = sum(item.planned_amount for item in request.items)
-        total_actual = sum(item.actual_amount or 0 for item in request.items)
-        remaining = request.total_budget - total_actual
-        
-        categories = {}
+        budget = BudgetAggregator(keep_items=True)
         for item in request.items:
-            if item.category not in categories:
-                categories[item.category] = {"planned": 0, "actual": 0, "items": []}
-            categories[item.category]["planned"] += item.planned_amount
-            categories[item.category]["actual"] += item.actual_amount or 0
-            categories[item.category]["items"].append(item.dict())
-        
-        return {
-            "total_budget": request.total_budget,
-            "total_planned": total_planned,
-            "total_spent": total_actual,
-            "remaining": remaining,
-            "categories": categories,
-            "currency": request.currency,
-            "over_budget": total_actual > request.total_budget
-        }
+            budget.add(item.name, item.category, item.planned_amount, item.actual_amount, item.recipient)
+        return budget.result(request.total_budget, request.currency)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/photo-caption")
-async def generate_caption(request: CaptionRequest):
+@app.post("/budget-tracker/bulk", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-tracker/bulk")
+async def track_budget_bulk(http_request: Request, total_budget: float = Query(allow_inf_nan=False), currency: str = "USD",
+                            include_items: bool = False, include_recipients: bool = True):
+    """Aggregate a streamed CSV or NDJSON upload of budget items"""
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        loader = load_csv
+    elif content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+        loader = load_ndjson
+    else:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+    
+    budget = BudgetAggregator(keep_items=include_items)
     try:
-        current_year = datetime.now().year
-        next_year = current_year + 1
-        current_month = datetime.now().month
-        
-        if current_month == 12:
-            time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}."
-        elif current_month == 1:
-            time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
+        await loader(iter_lines(http_request.stream()), budget)
+    except BudgetParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = budget.result(total_budget, currency, include_items=include_items)
+    result["item_count"] = budget.count
+    if include_recipients:
+        result["recipients"] = budget.recipient_totals()
+    return result
+
+@app.post("/budget-sessions", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-sessions")
+async def create_budget_session(request: BudgetRequest):
+    """Store a budget server-side so later changes can be sent one item at a time"""
+    session_id = budget_store.create_session(request.total_budget, request.currency, request.items)
+    return {"session_id": session_id, **budget_store.summary(session_id)}
+
+@app.get("/budget-sessions/{session_id}", response_model=BudgetResponse, response_model_exclude_unset=True)
+async def get_budget_session(session_id: str, include_items: bool = True):
+    try:
+        if include_items:
+            return budget_store.summary(session_id)
+        return budget_store.totals(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Budget session not found")
+
+@app.delete("/budget-sessions/{session_id}")
+async def delete_budget_session(session_id: str):
+    try:
+        budget_store.delete_session(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Budget session not found")
+    return {"message": "Budget session deleted", "session_id": session_id}
+
+@app.post("/budget-sessions/{session_id}/items", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-sessions/{session_id}/items")
+async def add_budget_item(session_id: str, item: BudgetItem):
+    try:
+        item_id = budget_store.add_item(session_id, item)
+        return {"item_id": item_id, **budget_store.totals(session_id)}
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Budget session not found")
+
+@app.put("/budget-sessions/{session_id}/items/{item_id}", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-sessions/{session_id}/items/{item_id}")
+async def update_budget_item(session_id: str, item_id: int, item: BudgetItem):
+    try:
+        budget_store.update_item(session_id, item_id, item)
+        return {"item_id": item_id, **budget_store.totals(session_id)}
+    except (SessionNotFound, ItemNotFound):
+        raise HTTPException(status_code=404, detail="Budget item not found")
+
+@app.delete("/budget-sessions/{session_id}/items/{item_id}", response_model=BudgetResponse, response_model_exclude_unset=True)
+@metrics.instrument("budget-sessions/{session_id}/items/{item_id}")
+async def remove_budget_item(session_id: str, item_id: int):
+    try:
+        budget_store.remove_item(session_id, item_id)
+        return {"item_id": item_id, **budget_store.totals(session_id)}
+    except (SessionNotFound, ItemNotFound):
+        raise HTTPException(status_code=404, detail="Budget item not found")
+
+@app.post("/photo-caption", response_model=CaptionResponse)
+@metrics.instrument("photo-caption")
+async def generate_caption(request: CaptionRequest, cache_control: Optional[str] = Header(None)):
+    try:
+        read_cache, write_cache = cache_directives(cache_control)
+        cache_key = caption_cache_key(request)
+        if read_cache:
+            cached = response_cache.get("photo-caption", cache_key)
+            warmer.record("photo-caption", request, cache_key, hit=cached is not None)
+            if cached is not None:
+                return {"caption": cached["caption"], "occasion": request.occasion}
         else:
-            time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
-        
-        hashtag_prompt = "Include 5-8 relevant hashtags" if request.hashtags else "No hashtags"
-        
-        prompt = f"""Create a {request.tone} social media caption for a {request.occasion} photo.
-        
-Timing context: {time_context}
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}.
-        
-Photo description: {request.photo_description}
-Tone: {request.tone}
-{hashtag_prompt}
-
-Make it engaging, shareable, and authentic. 1-2 sentences max."""
-        
-        response = model.generate_content(prompt)
-        caption = response.text.strip().strip('"').strip("'")
+            response_cache.bypass("photo-caption")
         
+        caption = await fresh_caption(request, write_cache)
         return {"caption": caption, "occasion": request.occasion}
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/create-wishlist")
-async def create_wishlist(request: WishlistRequest):
+        raise upstream_error(e)
+
+async def fresh_caption(request, write_cache):
+    with metrics.stage("prompt"):
+        prompt = prompts.PHOTO_CAPTION.render(
+            tone=request.tone, occasion=request.occasion, photo_description=request.photo_description,
+            hashtags="Include 5-8 relevant hashtags" if request.hashtags else "No hashtags",
+        )
+    
+    caption = (await llm.generate_text(prompt, route="photo-caption")).strip().strip('"').strip("'")
+    if write_cache:
+        response_cache.set("photo-caption", caption_cache_key(request), {"caption": caption})
+    return caption
+
+def save_wishlist(request, suggestions=None):
+    return wishlist_store.create(request.title, request.items, request.occasion, request.recipient_name,
+                                 request.privacy, suggestions)
+
+def wishlist_meta(request, wishlist_id):
+    return {
+        "wishlist_id": wishlist_id,
+        "title": request.title,
+        "items": request.items,
+        "recipient": request.recipient_name,
+        "occasion": request.occasion,
+        "share_url": wishlist_share_url(wishlist_id)
+    }
+
+async def build_wishlist(request, prompt=None):
+    """Generate the suggestions, store the wishlist and return the /create-wishlist response"""
+    suggestions = (await llm.generate_text(prompt or wishlist_prompt(request), route="create-wishlist",
+                                            premium=request.is_premium)).strip()
+    wishlist_id = save_wishlist(request, suggestions)
+    return {**wishlist_meta(request, wishlist_id), "ai_suggestions": suggestions}
+
+@app.post("/create-wishlist", response_model=WishlistResponse)
+@metrics.instrument("create-wishlist")
+async def create_wishlist(request: WishlistRequest, stream: bool = False):
     try:
-        current_year = datetime.now().year
-        next_year = current_year + 1
-        current_month = datetime.now().month
-        
-        if current_month == 12:
-            time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}."
-        elif current_month == 1:
-            time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
-        else:
-            time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
+        with metrics.stage("prompt"):
+            prompt = wishlist_prompt(request)
         
-        wishlist_id = str(uuid.uuid4())[:8]
+        if stream:
+            # Stored up front so the share link works while suggestions stream in
+            wishlist_id = save_wishlist(request)
+            chunks = llm.stream_text(prompt, route="create-wishlist", premium=request.is_premium)
+            return sse_response(chunks, wishlist_meta(request, wishlist_id), "ai_suggestions",
+                                on_complete=lambda text: wishlist_store.set_suggestions(wishlist_id, text))
         
-        # Generate smart suggestions based on items
-        prompt = f"""Analyze this {request.occasion} wishlist for {request.recipient_name} and provide:
-        
-Timing context: {time_context}
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}.
-        1. 3 additional gift suggestions that complement the existing items
-        2. Budget estimate for the wishlist
-        3. Priority ranking of items (most wanted to least)
-        
-        Wishlist items: {', '.join(request.items)}
-        
-        Format clearly with emojis and be helpful."""
-        
-        response = model.generate_content(prompt)
-        suggestions = response.text.strip()
-        
-        return {
-            "wishlist_id": wishlist_id,
-            "title": request.title,
-            "items": request.items,
-            "recipient": request.recipient_name,
-            "occasion": request.occasion,
-            "ai_suggestions": suggestions,
-            "share_url": f"ai-gift-genie.onrender.com/wishlist/{wishlist_id}"
-        }
+        return await build_wishlist(request, prompt)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+async def party_plan_job(payload):
+    return await build_party_plan(PartyPlannerRequest.model_validate(payload))
+
+async def wishlist_job(payload):
+    return await build_wishlist(WishlistRequest.model_validate(payload))
+
+job_queue.register("party-planner", party_plan_job)
+job_queue.register("create-wishlist", wishlist_job)
 
-@app.post("/generate-card")
-async def generate_card(request: CardRequest):
-    print(f"\n=== CARD REQUEST RECEIVED ===")
-    print(f"From: {request.sender_name} To: {request.recipient_name}")
-    print(f"Occasion: {request.occasion}, Style: {request.card_style}")
+def submit_job(kind, request):
     try:
-        current_year = datetime.now().year
-        next_year = current_year + 1
-        current_month = datetime.now().month
-        
-        if current_month == 12:
-            time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}."
-        elif current_month == 1:
-            time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
-        else:
-            time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
-        
-        prompt = f"""Create a beautiful {request.occasion} card message from {request.sender_name} to {request.recipient_name}.
-        
-Relationship: {request.relationship}
-Tone: {request.tone}
-Card style: {request.card_style}
-Custom message: {request.custom_message or 'None'}
-Timing context: {time_context}
-
-Generate:
-1. Front cover text (short, catchy)
-2. Inside message (heartfelt, 2-3 sentences)
-3. Closing signature suggestion
-
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}.
-Make it {request.tone} and appropriate for their {request.relationship} relationship."""
-        
-        print("Calling Gemini API for card...")
-        response = model.generate_content(prompt)
-        card_content = response.text.strip()
-        print(f"Card generated: {card_content[:100]}...")
-        
-        return {
-            "card_content": card_content,
+        job = job_queue.submit(kind, request.model_dump(), premium=request.is_premium)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Too many queued jobs, please retry shortly",
+                            headers={"Retry-After": "10"})
+    log.info("job_submitted", job_id=job["job_id"], kind=kind, lane=job["lane"])
+    return {"job_id": job["job_id"], "status": job["status"], "lane": job["lane"],
+            "status_url": f"/jobs/{job['job_id']}"}
+
+@app.post("/jobs/party-planner", status_code=202)
+@metrics.instrument("jobs/party-planner")
+async def submit_party_plan_job(request: PartyPlannerRequest):
+    """Queue a party plan; poll GET /jobs/{job_id} for the result"""
+    return submit_job("party-planner", request)
+
+@app.post("/jobs/create-wishlist", status_code=202)
+@metrics.instrument("jobs/create-wishlist")
+async def submit_wishlist_job(request: WishlistRequest):
+    """Queue a wishlist; poll GET /jobs/{job_id} for the result"""
+    return submit_job("create-wishlist", request)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status: queued, running, done (with result) or failed (with error)"""
+    try:
+        return job_queue.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@app.get("/wishlist/{wishlist_id}")
+async def get_wishlist(wishlist_id: str):
+    """A shared wishlist with the suggestions generated when it was created"""
+    try:
+        wishlist = wishlist_store.get(wishlist_id)
+    except WishlistNotFound:
+        raise HTTPException(status_code=404, detail="Wishlist not found")
+    if wishlist["privacy"] == "private":
+        raise HTTPException(status_code=403, detail="This wishlist is private")
+    return {**wishlist, "share_url": wishlist_share_url(wishlist_id)}
+
+@app.post("/generate-card", response_model=CardResponse)
+@metrics.instrument("generate-card")
+async def generate_card(request: CardRequest, stream: bool = False, cache_control: Optional[str] = Header(None)):
+    log.info("card_request", occasion=request.occasion, style=request.card_style, stream=stream)
+    try:
+        read_cache, write_cache = cache_directives(cache_control)
+        cache_key = card_cache_key(request)
+        meta = {
             "occasion": request.occasion,
             "style": request.card_style,
             "recipient": request.recipient_name,
             "sender": request.sender_name
         }
+        if read_cache:
+            cached = response_cache.get("generate-card", cache_key)
+            if cached is not None:
+                if stream:
+                    return sse_response(single_chunk(cached["card_content"]), meta, "card_content")
+                return {"card_content": cached["card_content"], **meta}
+        else:
+            response_cache.bypass("generate-card")
+        
+        with metrics.stage("prompt"):
+            prompt = prompts.CARD.render(
+                occasion=request.occasion, sender_name=request.sender_name, recipient_name=request.recipient_name,
+                relationship=request.relationship, tone=request.tone, card_style=request.card_style,
+                custom_message=request.custom_message or 'None',
+            )
+        
+        def store(card_content):
+            if write_cache and card_content:
+                response_cache.set("generate-card", cache_key, {"card_content": card_content})
+        
+        if stream:
+            return sse_response(llm.stream_text(prompt, route="generate-card"), meta, "card_content", on_complete=store)
+        
+        card_content = (await llm.generate_text(prompt, route="generate-card")).strip()
+        log.debug("card_generated", chars=len(card_content))
+        store(card_content)
+        
+        return {"card_content": card_content, **meta}
         
     except Exception as e:
-        print(f"CARD ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error("card_failed", error=str(e), exc_info=not isinstance(e, (HTTPException, LLMUnavailable)))
+        raise upstream_error(e)
 
-@app.post("/secret-santa")
+@app.post("/secret-santa", response_model=SecretSantaResponse)
+@metrics.instrument("secret-santa")
 async def generate_secret_santa(request: SecretSantaRequest):
-    print(f"\n=== SECRET SANTA REQUEST ===")
-    print(f"Participants: {len(request.names)}")
+    log.info("secret_santa_request", participants=len(request.names))
     try:
-        import random
-        
         if len(request.names) < 2:
             raise HTTPException(status_code=400, detail="Need at least 2 participants")
+        if len(set(request.names)) != len(request.names):
+            raise HTTPException(status_code=400, detail="Participant names must be unique")
         
-        givers = request.names.copy()
-        receivers = request.names.copy()
-        assignments = {}
-        max_attempts = 100
-        
-        for attempt in range(max_attempts):
-            random.shuffle(receivers)
-            valid = True
-            temp_assignments = {}
-            
-            for i, giver in enumerate(givers):
-                receiver = receivers[i]
-                
-                # Can't give to yourself
-                if giver == receiver:
-                    valid = False
-                    break
-                
-                # Check exclusions
-                if request.exclude_pairs:
-                    for pair in request.exclude_pairs:
-                        if giver in pair and receiver in pair:
-                            valid = False
-                            break
-                
-                if not valid:
-                    break
-                    
-                temp_assignments[giver] = receiver
-            
-            if valid:
-                assignments = temp_assignments
-                break
-        
-        if not assignments:
-            raise HTTPException(status_code=400, detail="Could not generate valid assignments. Try removing some exclusions.")
+        try:
+            pairs = assign_secret_santa(request.names, request.exclude_pairs, seed=request.seed)
+        except NoValidAssignment:
+            raise HTTPException(status_code=400, detail="No valid assignment exists with these exclusions. Try removing some exclusions.")
         
         # Format results
-        results = [{"giver": k, "receiver": v} for k, v in assignments.items()]
+        results = [{"giver": giver, "receiver": receiver} for giver, receiver in pairs]
         
         return {
             "success": True,
@@ -402,13 +618,58 @@ async def generate_secret_santa(request: SecretSantaRequest):
             "total_participants": len(request.names)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"ERROR: {str(e)}")
+        log.exception("secret_santa_failed", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache-stats")
+async def cache_stats():
+    """Hit/miss counters for the response cache"""
+    return response_cache.snapshot()
+
+@app.get("/llm-stats")
+async def llm_stats():
+    """Upstream call counters, including calls collapsed into an in-flight duplicate"""
+    return {**llm.stats, "in_flight": len(llm._inflight),
+            "breakers": {name: breaker.state for name, breaker in llm.breakers.items()}}
+
+@app.get("/warmer-stats")
+async def warmer_stats():
+    """Most requested shapes, which of them the warmer keeps cached, and its remaining call budget"""
+    return warmer.snapshot()
+
+@app.get("/prompt-stats")
+async def prompt_stats():
+    """Estimated tokens per prompt template: fixed text and rendered prompts so far"""
+    return prompts.snapshot()
+
+@app.get("/model-routes")
+async def model_routes():
+    """Which model (and generation config) serves each endpoint"""
+    return llm.routes.snapshot()
+
+@app.post("/admin/model-routes/reload")
+async def reload_model_routes(x_admin_token: Optional[str] = Header(None)):
+    """Re-read the routing table now instead of waiting for the file check"""
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+    try:
+        llm.routes.load()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Routing table not reloaded: {e}")
+    return llm.routes.snapshot()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/list-models")
 async def list_models():
     try:
+        genai = await asyncio.get_running_loop().run_in_executor(None, llm.genai_client)
         models = genai.list_models()
         model_list = [m.name for m in models if 'generateContent' in m.supported_generation_methods]
         return {"models": model_list}
@@ -416,139 +677,157 @@ async def list_models():
         return {"error": str(e)}
 
 @app.get("/test")
+@metrics.instrument("test")
 async def test():
     try:
-        response = model.generate_content("Say hello in one word")
-        return {"status": "success", "response": response.text, "model": model.model_name}
+        text = await llm.generate_text("Say hello in one word", route="test")
+        return {"status": "success", "response": text, "model": llm.route_model_name("test")}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
-@app.post("/generate-gifts")
-async def generate_gifts(request: GiftRequest):
-    print(f"\n=== GIFT REQUEST RECEIVED ===")
-    print(f"Recipient: {request.recipient_name}")
-    print(f"Interests: {request.interests}")
+def cached_gifts(request, read_cache, count=GIFT_PAGE_SIZE):
+    if not read_cache:
+        response_cache.bypass("generate-gifts")
+        return None
+    key = gift_cache_key(request)
+    cached = response_cache.get("generate-gifts", key)
+    warmer.record("generate-gifts", request, key, hit=cached is not None)
+    # A shorter list cached by an earlier call can't fill the pages asked for
+    if cached is None or (count > GIFT_PAGE_SIZE and len(cached["gifts"]) < count):
+        return None
+    return cached["gifts"]
+
+async def fresh_gifts(request, write_cache, count=GIFT_PAGE_SIZE):
+    gifts, parser = await generate_gift_list(request, count)
+    log.debug("gifts_parsed", count=len(gifts), parser=parser)
+    if write_cache and gifts:
+        response_cache.set("generate-gifts", gift_cache_key(request), {"gifts": gifts})
+    return gifts
+
+def catalog_gifts(request, reason, count=GIFT_PAGE_SIZE):
+    with metrics.stage("catalog"):
+        gifts = gift_catalog.suggest(request, count)
+    catalog_suggestions.inc(reason=reason)
+    return first_page(gifts, request.recipient_name, "catalog")
+
+@app.post("/generate-gifts", response_model=GiftPage)
+@metrics.instrument("generate-gifts")
+async def generate_gifts(request: GiftRequest, stream: bool = False, pages: int = 1,
+                         cache_control: Optional[str] = Header(None)):
+    """Gift ideas; pages > 1 generates that many pages in one call and returns a next_cursor"""
+    log.info("gift_request", interests=len(request.interests), occasion=request.occasion, stream=stream, pages=pages)
+    count = GIFT_PAGE_SIZE * clamp_pages(pages)
+    read_cache, write_cache = cache_directives(cache_control)
+    gifts = cached_gifts(request, read_cache, count)
+    if gifts is not None:
+        log.debug("gift_cache_hit")
+        result = first_page(gifts, request.recipient_name, "llm")
+        if stream:
+            return StreamingResponse(iter([sse_event("gifts", result), sse_event("done", {})]),
+                                     media_type="text/event-stream", headers=SSE_HEADERS)
+        return result
+    
+    if stream:
+        # Catalog picks straight away, replaced by the model's once they arrive
+        async def events():
+            yield sse_event("gifts", catalog_gifts(request, "stream"))
+            try:
+                gifts = await fresh_gifts(request, write_cache, count)
+                yield sse_event("gifts", first_page(gifts, request.recipient_name, "llm"))
+            except Exception as e:
+                log.warning("gifts_stream_failed", error=str(e))
+                yield sse_event("error", {"detail": str(e)})
+            yield sse_event("done", {})
+        return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+    
     try:
-        print(f"Generating gifts for {request.recipient_name}...")
-        
-        currency_symbols = {'USD': '$', 'EUR': '€', 'GBP': '£', 'INR': '₹', 'JPY': '¥', 'AUD': 'A$', 'CAD': 'C$', 'CNY': '¥', 'AED': 'د.إ'}
-        currency_symbol = currency_symbols.get(request.currency, '$')
-        
-        prompt = f"""Generate 3 gift ideas for {request.recipient_name} for {request.occasion}.
-
-Details:
-- Age: {request.age or 'Not specified'}
-- Relationship: {request.relationship}
-- Interests: {', '.join(request.interests) if request.interests else 'General'}
-- Location: {request.location or 'Not specified'}
-- Budget: {currency_symbol}{request.budget_min or 20} - {currency_symbol}{request.budget_max or 100} ({request.currency})
-- Personality: {request.personality or 'Friendly'}
-
-For each gift, provide:
-1. Name
-2. Description (1-2 sentences)
-3. Why it's perfect
-4. Price estimate (MUST use {request.currency} currency with {currency_symbol} symbol)
-5. Where to buy (consider location: {request.location or 'general'})
-
-IMPORTANT: All prices MUST be in {request.currency} currency using {currency_symbol} symbol.
-Format each gift clearly numbered 1-3."""
-        
-        print("Calling Gemini API...")
-        response = model.generate_content(prompt)
-        text = response.text
-        print(f"Response: {text[:200]}...")
-        
-        # Simple parser
-        gifts = []
-        lines = text.split('\n')
-        current = {}
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # New gift starts
-            if line[0].isdigit() and '.' in line[:3]:
-                if current and 'name' in current:
-                    gifts.append(current)
-                current = {'name': line.split('.', 1)[1].strip() if '.' in line else line}
-            elif current:
-                # Add to description
-                if 'description' not in current:
-                    current['description'] = line
-                elif 'reason' not in current:
-                    current['reason'] = line
-                elif 'price_range' not in current:
-                    current['price_range'] = line
-                elif 'where_to_buy' not in current:
-                    current['where_to_buy'] = line
-        
-        if current and 'name' in current:
-            gifts.append(current)
-        
-        # Ensure all gifts have required fields
-        for gift in gifts:
-            gift.setdefault('description', 'A thoughtful gift')
-            gift.setdefault('reason', 'Perfect for them')
-            gift.setdefault('price_range', f"{currency_symbol}{request.budget_min or 20}-{currency_symbol}{request.budget_max or 100}")
-            gift.setdefault('where_to_buy', 'Online or local stores')
-        
-        print(f"Parsed {len(gifts)} gifts")
-        return {"gifts": gifts[:3], "recipient": request.recipient_name}
-        
+        gifts = await fresh_gifts(request, write_cache, count)
+        return first_page(gifts, request.recipient_name, "llm")
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        # Slow, overloaded or failing upstream: answer from the catalog instead of an error
+        log.warning("gifts_fallback", error=str(e), exc_info=not isinstance(e, LLMUnavailable))
+        return catalog_gifts(request, "fallback", count)
+
+@app.get("/generate-gifts/more", response_model=GiftPage)
+@metrics.instrument("generate-gifts/more")
+async def more_gifts(cursor: str):
+    """The next page of a /generate-gifts?pages=N result; no model call"""
+    try:
+        return next_page(cursor)
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="These suggestions have expired, please generate again")
+
+@app.post("/generate-gifts/instant", response_model=GiftPage)
+@metrics.instrument("generate-gifts/instant")
+async def instant_gifts(request: GiftRequest, pages: int = 1):
+    """Gift ideas from the bundled catalog, without a model call"""
+    return catalog_gifts(request, "instant", GIFT_PAGE_SIZE * clamp_pages(pages))
+
+@app.post("/generate-gifts/batch")
+@metrics.instrument("generate-gifts/batch")
+async def generate_gifts_batch(request: GiftBatchRequest, stream: bool = True,
+                               cache_control: Optional[str] = Header(None)):
+    """Gift ideas for several recipients; streamed back per recipient as they complete"""
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="Need at least 1 recipient")
+    log.info("gift_batch_request", recipients=len(request.requests), stream=stream)
+    read_cache, write_cache = cache_directives(cache_control)
+    
+    async def results():
+        pending = []
+        for index, gift_request in enumerate(request.requests):
+            cached = response_cache.get("generate-gifts", gift_cache_key(gift_request)) if read_cache else None
+            if cached is not None:
+                yield index, cached["gifts"][:GIFT_PAGE_SIZE], None
+            else:
+                pending.append((index, gift_request))
+        async for index, gifts, error in generate_batch(pending):
+            if gifts and write_cache:
+                response_cache.set("generate-gifts", gift_cache_key(request.requests[index]), {"gifts": gifts})
+            yield index, gifts, error
+    
+    def payload(index, gifts, error):
+        result = {"index": index, "recipient": request.requests[index].recipient_name}
+        if error is not None:
+            return {**result, "detail": str(error)}
+        return {**result, "gifts": gifts}
+    
+    if not stream:
+        collected = [payload(*result) async for result in results()]
+        return {"results": sorted(collected, key=lambda r: r["index"])}
+    
+    async def events():
+        async for index, gifts, error in results():
+            yield sse_event("error" if error is not None else "gifts", payload(index, gifts, error))
+        yield sse_event("done", {"count": len(request.requests)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
-@app.post("/generate-message")
-async def generate_message(request: MessageRequest):
-    global free_messages_used
-    print(f"\n=== MESSAGE REQUEST RECEIVED ===")
-    print(f"Recipient: {request.recipient_name}")
+@app.post("/generate-message", response_model=MessageResponse, response_model_exclude_unset=True)
+@metrics.instrument("generate-message")
+async def generate_message(request: MessageRequest, http_request: Request,
+                           cache_control: Optional[str] = Header(None)):
+    log.info("message_request", premium=request.is_premium, tone=request.tone)
     
     try:
         # Check if user has premium or if they've exceeded free limit
-        if not request.is_premium and free_messages_used >= MAX_FREE_MESSAGES:
-            return {
-                "message": None,
-                "recipient": request.recipient_name,
-                "requires_subscription": True,
-                "sample_messages": get_sample_messages(),
-                "free_messages_used": free_messages_used,
-                "max_free_messages": MAX_FREE_MESSAGES
-            }
+        if not request.is_premium:
+            allowed, free_messages_used = quota_store.consume(
+                "free-messages", client_id(http_request), MAX_FREE_MESSAGES, FREE_MESSAGES_WINDOW)
+            if not allowed:
+                return {
+                    "message": None,
+                    "recipient": request.recipient_name,
+                    "requires_subscription": True,
+                    "sample_messages": get_sample_messages(),
+                    "free_messages_used": free_messages_used,
+                    "max_free_messages": MAX_FREE_MESSAGES
+                }
         
         # For free users, generate personalized message using AI but mark as sample
         if not request.is_premium:
-            free_messages_used += 1
-            
             # Generate actual personalized message for free users too
-            current_year = datetime.now().year
-            next_year = current_year + 1
-            current_month = datetime.now().month
-            
-            if current_month == 12:
-                time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}. Christmas is here/approaching."
-            elif current_month == 1:
-                time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
-            else:
-                time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
-            
-            prompt = f"""Write a {request.tone} {request.occasion} message for {request.recipient_name}.
-            
-Relationship: {request.relationship}
-Gift context: {request.gift_context or 'None'}
-Special note: {request.special_message or 'None'}
-Timing context: {time_context}
-
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}. Write a warm, personal message (2-4 sentences). Just the message, no quotes."""
-            
-            response = model.generate_content(prompt)
-            sample_message = response.text.strip().strip('"').strip("'")
+            sample_message = await message_text(request, cache_control)
             
             return {
                 "message": sample_message,
@@ -559,40 +838,38 @@ IMPORTANT: Use correct year references - we are currently in {current_year}, and
             }
         
         # Premium users get AI-generated messages
-        print(f"Generating AI message for {request.recipient_name}...")
-        current_year = datetime.now().year
-        next_year = current_year + 1
-        current_month = datetime.now().month
-        
-        # Smart context based on timing
-        if current_month == 12:
-            time_context = f"Current year: {current_year} (December), upcoming new year: {next_year}. Christmas is here/approaching."
-        elif current_month == 1:
-            time_context = f"Current year: {current_year} (January), we just entered this new year from {current_year-1}."
-        else:
-            time_context = f"Current year: {current_year}, upcoming new year will be: {next_year}."
-        
-        prompt = f"""Write a {request.tone} {request.occasion} message for {request.recipient_name}.
-        
-Relationship: {request.relationship}
-Gift context: {request.gift_context or 'None'}
-Special note: {request.special_message or 'None'}
-Timing context: {time_context}
-
-IMPORTANT: Use correct year references - we are currently in {current_year}, and the upcoming new year is {next_year}. Write a warm, personal message (2-4 sentences). Just the message, no quotes."""
-        
-        print("Calling Gemini API...")
-        response = model.generate_content(prompt)
-        message = response.text.strip().strip('"').strip("'")
-        print(f"Message: {message[:100]}...")
+        message = await message_text(request, cache_control, premium=True)
         
         return {"message": message, "recipient": request.recipient_name, "is_premium": True}
         
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error("message_failed", error=str(e), exc_info=not isinstance(e, (HTTPException, LLMUnavailable)))
+        raise upstream_error(e)
+
+async def message_text(request, cache_control, premium=False):
+    read_cache, write_cache = cache_directives(cache_control)
+    cache_key = message_cache_key(request)
+    if read_cache:
+        cached = response_cache.get("generate-message", cache_key)
+        warmer.record("generate-message", request, cache_key, hit=cached is not None)
+        if cached is not None:
+            return cached["message"]
+    else:
+        response_cache.bypass("generate-message")
+    return await fresh_message(request, write_cache, premium)
+
+async def fresh_message(request, write_cache, premium=False):
+    with metrics.stage("prompt"):
+        prompt = message_prompt(request)
+    
+    message = (await llm.generate_text(prompt, route="generate-message", premium=premium)).strip().strip('"').strip("'")
+    if write_cache:
+        response_cache.set("generate-message", message_cache_key(request), {"message": message})
+    return message
+
+warmer.register("generate-gifts", GiftRequest, gift_cache_key, lambda request: fresh_gifts(request, True))
+warmer.register("photo-caption", CaptionRequest, caption_cache_key, lambda request: fresh_caption(request, True))
+warmer.register("generate-message", MessageRequest, message_cache_key, lambda request: fresh_message(request, True))
 
 if __name__ == "__main__":
     import uvicorn
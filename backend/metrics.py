@@ -0,0 +1,225 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+Counters and histograms live in memory and are rendered on GET /metrics.
+Counters that other modules already keep (llm.stats, the response cache)
+are exported through collectors at scrape time instead of being counted
+twice.
+
+Per-request stages, per route and model:
+  parse          request received -> handler called (body read + validation)
+  prompt         building the prompt
+  upstream       model call, including retries and waiting for a slot
+  response_parse turning the model's text into the response fields
+  catalog        answering from the local gift catalog instead
+  serialize      handler returned -> response headers sent (JSON encoding + compression)
+
+Handlers opt in with @instrument("route") under the @app decorator;
+MetricsMiddleware supplies the request start and response timestamps.
+"""
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_collectors = []
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _label_str(self.labels, key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, edge in enumerate(self.buckets):
+                if value <= edge:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def count(self, **labels):
+        row = self._values.get(tuple(str(labels.get(n, "")) for n in self.labels))
+        return sum(row[:-1]) if row else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        for key, row in items:
+            cumulative = 0
+            for edge, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                yield (f"{self.name}_bucket", _label_str(self.labels + ("le",), key + (edge,)), cumulative)
+            yield f"{self.name}_count", _label_str(self.labels, key), cumulative
+            yield f"{self.name}_sum", _label_str(self.labels, key), row[-1]
+
+
+def register_collector(collect):
+    """collect() -> iterable of (name, kind, help, [(labels dict, value), ...]), called per scrape"""
+    _collectors.append(collect)
+
+
+def _format(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format(value)}")
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+requests_total = Counter("http_requests_total", "HTTP requests by route, method and status",
+                         ("route", "method", "status"))
+request_seconds = Histogram("http_request_duration_seconds", "Time from request received to response sent",
+                            ("route", "method"))
+stage_seconds = Histogram("request_stage_seconds", "Time spent per request stage", ("route", "stage", "model"))
+llm_tokens = Counter("llm_tokens_total", "Upstream model tokens (estimated when the model doesn't report usage)",
+                     ("route", "model", "kind"))
+errors_total = Counter("errors_total", "Handler errors by route and exception type", ("route", "error"))
+
+_route = contextvars.ContextVar("metrics_route", default=None)
+_timing = contextvars.ContextVar("metrics_timing", default=None)
+
+
+def current_route():
+    return _route.get()
+
+
+def _model_name():
+    import llm
+    return llm.route_model_name(_route.get())
+
+
+def observe_stage(stage, seconds, route=None, model=None):
+    stage_seconds.observe(seconds, route=route or _route.get() or "unknown", stage=stage,
+                          model=model or _model_name())
+
+
+@contextmanager
+def stage(name, route=None, model=None):
+    """Time a block as one stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, route, model)
+
+
+def instrument(route):
+    """Name a handler's route for metrics and time its parse and serialize stages"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            _route.set(route)
+            timing = _timing.get()
+            if timing is not None:
+                timing["route"] = route
+                observe_stage("parse", time.perf_counter() - timing["start"], route)
+            try:
+                result = await handler(*args, **kwargs)
+            except Exception as e:
+                errors_total.inc(route=route, error=type(e).__name__)
+                raise
+            if timing is not None:
+                timing["returned"] = time.perf_counter()
+            return result
+        return wrapper
+    return decorate
+
+
+class MetricsMiddleware:
+    """Request count and latency per route; closes the parse/serialize stages opened by @instrument"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timing = {"start": time.perf_counter(), "route": None, "returned": None}
+        _timing.set(timing)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timing["returned"] is not None:
+                    observe_stage("serialize", time.perf_counter() - timing["returned"], timing["route"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = timing["route"]
+            if route is None:
+                # Fall back to the path template so unknown paths don't create new series
+                matched = scope.get("route")
+                route = getattr(matched, "path", "unmatched")
+            requests_total.inc(route=route, method=scope["method"], status=status)
+            request_seconds.observe(time.perf_counter() - timing["start"], route=route, method=scope["method"])
@@ -0,0 +1,134 @@
+"""
+Which model serves which endpoint.
+
+The routing table maps a route name (the same names used for deadlines
+and metrics) to a primary model and an optional fallback, each with its
+own generation config. Routes not listed use "default". Short outputs
+(captions, messages, cards) go to a lighter model; long plans stay on the
+full one.
+
+The table is read from MODEL_ROUTES_PATH (backend/model_routes.json by
+default). The file is checked for changes at most every
+MODEL_ROUTES_CHECK_SECONDS and can be reloaded on demand, so tuning needs
+no restart. An invalid file is rejected and the previous table stays in
+use.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from logs import get_logger
+
+MODEL_ROUTES_PATH = os.getenv("MODEL_ROUTES_PATH", str(Path(__file__).parent / "model_routes.json"))
+MODEL_ROUTES_CHECK_SECONDS = float(os.getenv("MODEL_ROUTES_CHECK_SECONDS", "5"))
+
+GENERATION_CONFIG_KEYS = {"max_output_tokens", "temperature", "top_p", "top_k", "candidate_count",
+                          "stop_sequences", "response_mime_type"}
+
+log = get_logger("model_routing")
+
+
+class Target(NamedTuple):
+    model: str
+    generation_config: dict
+
+
+class Route(NamedTuple):
+    primary: Target
+    fallback: Optional[Target]
+
+
+def _target(spec, where):
+    if not isinstance(spec, dict) or not isinstance(spec.get("model"), str) or not spec["model"]:
+        raise ValueError(f"{where}: needs a \"model\" name")
+    config = spec.get("generation_config") or {}
+    unknown = set(config) - GENERATION_CONFIG_KEYS
+    if unknown:
+        raise ValueError(f"{where}: unknown generation_config keys {sorted(unknown)}")
+    return Target(spec["model"], dict(config))
+
+
+def parse_routes(data):
+    """{route: {"primary": {...}, "fallback": {...}}} -> {route: Route}; raises ValueError"""
+    if not isinstance(data, dict) or not isinstance(data.get("routes"), dict):
+        raise ValueError("expected an object with a \"routes\" object")
+    parsed = {}
+    for name, entry in data["routes"].items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"{name}: expected an object")
+        fallback = entry.get("fallback")
+        parsed[name] = Route(_target(entry.get("primary"), f"{name}.primary"),
+                             _target(fallback, f"{name}.fallback") if fallback else None)
+    return parsed
+
+
+class RoutingTable:
+    def __init__(self, default_model, path=MODEL_ROUTES_PATH, check_interval=MODEL_ROUTES_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self.builtin = Route(Target(default_model, {}), None)
+        self.routes = {}
+        self.mtime = None
+        self.loaded_at = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the file now; raises ValueError (keeping the current table) if it is invalid"""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                with open(self.path, encoding="utf-8") as f:
+                    routes = parse_routes(json.load(f))
+            except FileNotFoundError:
+                mtime, routes = None, {}
+            except (OSError, json.JSONDecodeError) as e:
+                raise ValueError(f"{self.path}: {e}") from e
+            self.routes, self.mtime, self.loaded_at = routes, mtime, time.time()
+            self._checked_at = time.monotonic()
+        log.info("model_routes_loaded", path=self.path, routes=len(routes))
+        return routes
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self.mtime:
+            try:
+                self.load()
+            except ValueError as e:
+                # Don't retry the broken file until it changes again
+                self.mtime = mtime
+                log.warning("model_routes_invalid", error=str(e))
+
+    def resolve(self, route):
+        self.maybe_reload()
+        return self.routes.get(route) or self.routes.get("default") or self.builtin
+
+    def model_names(self):
+        names = {self.builtin.primary.model}
+        for entry in self.routes.values():
+            names.add(entry.primary.model)
+            if entry.fallback:
+                names.add(entry.fallback.model)
+        return sorted(names)
+
+    def snapshot(self):
+        self.maybe_reload()
+
+        def target(t):
+            return {"model": t.model, "generation_config": t.generation_config} if t else None
+        return {
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "routes": {name: {"primary": target(r.primary), "fallback": target(r.fallback)}
+                       for name, r in self.routes.items()},
+        }
@@ -0,0 +1,244 @@
+"""
+Prompt templates for every model call.
+
+Templates are str.format strings parsed once when this module is imported:
+a template with broken braces or an unexpected field fails the app at
+startup, not on the first request that uses it. Rendering checks every
+field is supplied.
+
+The timing context (which year it is, whether the new year is coming up)
+is worked out once per day and filled in automatically. The rules every
+prompt used to repeat (get the years right, follow the requested format)
+live in SYSTEM_INSTRUCTION, which llm.py sets once on each Gemini model
+instead of every prompt carrying it.
+
+Each template's size is tracked: static_tokens is the fixed text, and
+every render is counted in the prompt_tokens histogram, so the expensive
+templates are easy to spot (GET /prompt-stats, GET /metrics).
+
+A template over its token budget (limits.PROMPT_TOKEN_BUDGETS) has its
+`trim` fields clipped, in order, until it fits; the tokens cut are counted
+per template.
+"""
+import functools
+import string
+from datetime import date
+from typing import NamedTuple
+
+import limits
+import llm
+import metrics
+from logs import get_logger
+
+log = get_logger("prompts")
+
+SYSTEM_INSTRUCTION = (
+    "You are AI Gift Genie, a festive assistant for gift ideas, messages, cards, photo captions, "
+    "wishlists and party plans. Each request has a timing context: use it for any year you mention, "
+    "so 'this year' and 'the new year' are always the right years. Follow the requested format exactly."
+)
+
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+prompt_tokens = metrics.Histogram("prompt_tokens", "Estimated tokens per rendered prompt", ("template",),
+                                  buckets=TOKEN_BUCKETS)
+prompt_trimmed = metrics.Counter("prompt_trimmed_total", "Prompts clipped to fit their token budget", ("template",))
+prompt_trimmed_tokens = metrics.Counter("prompt_trimmed_tokens_total",
+                                        "Estimated tokens clipped from prompts over budget", ("template",))
+
+templates = {}
+
+
+class TimeContext(NamedTuple):
+    year: int
+    next_year: int
+    text: str
+
+
+@functools.lru_cache(maxsize=2)
+def _time_context(today):
+    year, next_year = today.year, today.year + 1
+    if today.month == 12:
+        text = f"Current year: {year} (December), upcoming new year: {next_year}. Christmas is here/approaching."
+    elif today.month == 1:
+        text = f"Current year: {year} (January), we just entered this new year from {year - 1}."
+    else:
+        text = f"Current year: {year}, upcoming new year will be: {next_year}."
+    return TimeContext(year, next_year, text)
+
+
+def time_context():
+    """Today's timing context, computed once per day"""
+    return _time_context(date.today())
+
+
+class Template:
+    def __init__(self, name, text, trim=()):
+        self.name = name
+        self.text = text
+        self.budget = limits.PROMPT_TOKEN_BUDGETS.get(name, 0)
+        # Fields that may be clipped to fit the budget, least important first
+        self.trim = trim
+        self.fields = set()
+        static = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            static.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"prompt {name!r}: unsupported field {{{field}}}")
+            self.fields.add(field)
+        self.static_tokens = llm.estimate_tokens("".join(static))
+        self.renders = 0
+        self.tokens_total = 0
+        self.max_tokens = 0
+        self.trims = 0
+        self.trimmed_tokens = 0
+        if not set(trim) <= self.fields:
+            raise ValueError(f"prompt {name!r}: can't trim unknown fields {sorted(set(trim) - self.fields)}")
+        if name in templates:
+            raise ValueError(f"prompt {name!r} is defined twice")
+        templates[name] = self
+
+    def render(self, **values):
+        if "time_context" in self.fields:
+            values["time_context"] = time_context().text
+        missing = self.fields - values.keys()
+        if missing:
+            raise ValueError(f"prompt {self.name!r}: missing {sorted(missing)}")
+        prompt = self.text.format_map(values)
+        tokens = llm.estimate_tokens(prompt)
+        if self.budget and tokens > self.budget and self.trim:
+            prompt, tokens = self._trim(values, tokens)
+        self.renders += 1
+        self.tokens_total += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        prompt_tokens.observe(tokens, template=self.name)
+        return prompt
+
+    def _trim(self, values, tokens):
+        """Clip the trim fields in order until the prompt fits the budget (or they are as short as allowed)"""
+        before = tokens
+        for field in self.trim:
+            over = tokens - self.budget
+            if over <= 0:
+                break
+            text = str(values[field])
+            # ~4 characters per token, plus slack for the word boundary and the …
+            values[field] = limits.clip(text, max(limits.PROMPT_MIN_FIELD_CHARS, len(text) - over * 4 - 4))
+            prompt = self.text.format_map(values)
+            tokens = llm.estimate_tokens(prompt)
+        if tokens < before:
+            self.trims += 1
+            self.trimmed_tokens += before - tokens
+            prompt_trimmed.inc(template=self.name)
+            prompt_trimmed_tokens.inc(before - tokens, template=self.name)
+            log.info("prompt_trimmed", template=self.name, tokens_before=before, tokens=tokens, budget=self.budget)
+        return prompt, tokens
+
+
+def snapshot():
+    return {
+        "system_instruction_tokens": llm.estimate_tokens(SYSTEM_INSTRUCTION),
+        "templates": {
+            name: {
+                "static_tokens": t.static_tokens,
+                "renders": t.renders,
+                "avg_tokens": round(t.tokens_total / t.renders, 1) if t.renders else None,
+                "max_tokens": t.max_tokens,
+                "budget": t.budget or None,
+                "trimmed": t.trims,
+                "trimmed_tokens": t.trimmed_tokens,
+            }
+            for name, t in sorted(templates.items(), key=lambda item: -item[1].static_tokens)
+        },
+    }
+
+
+def check():
+    """Log template sizes at startup; every template already compiled on import"""
+    log.info("prompts_ready", templates=len(templates),
+             static_tokens={name: t.static_tokens for name, t in templates.items()})
+
+
+PARTY_PLAN = Template("party-plan", """Create a comprehensive {occasion} party plan for {guest_count} guests.
+Timing context: {time_context}
+
+Details:
+- Budget: {budget}
+- Venue: {venue_type}
+- Theme: {theme}
+- Age group: {age_group}
+- Dietary restrictions: {dietary_restrictions}
+
+Provide:
+1. Theme & Decorations (3-4 ideas)
+2. Food & Drinks Menu (5-6 items)
+3. Activities & Games (4-5 options)
+4. Timeline (hour by hour)
+5. Shopping List (essentials)
+
+Make it creative, engaging, and budget-conscious. Format clearly with emojis.""", trim=("dietary_restrictions", "theme"))
+
+WISHLIST = Template("wishlist", """Analyze this {occasion} wishlist for {recipient_name} and provide:
+1. 3 additional gift suggestions that complement the existing items
+2. Budget estimate for the wishlist
+3. Priority ranking of items (most wanted to least)
+
+Wishlist items: {items}
+Timing context: {time_context}
+Format clearly with emojis and be helpful.""", trim=("items",))
+
+PHOTO_CAPTION = Template("photo-caption", """Create a {tone} social media caption for a {occasion} photo.
+Photo description: {photo_description}
+{hashtags}
+Timing context: {time_context}
+Make it engaging, shareable, and authentic. 1-2 sentences max.""", trim=("photo_description",))
+
+CARD = Template("card", """Create a beautiful {occasion} card message from {sender_name} to {recipient_name}.
+Relationship: {relationship}
+Tone: {tone}
+Card style: {card_style}
+Custom message: {custom_message}
+Timing context: {time_context}
+
+Generate:
+1. Front cover text (short, catchy)
+2. Inside message (heartfelt, 2-3 sentences)
+3. Closing signature suggestion
+
+Make it {tone} and appropriate for their {relationship} relationship.""", trim=("custom_message",))
+
+MESSAGE = Template("message", """Write a {tone} {occasion} message for {recipient_name}.
+Relationship: {relationship}
+Gift context: {gift_context}
+Special note: {special_message}
+Timing context: {time_context}
+Write a warm, personal message (2-4 sentences). Just the message, no quotes.""", trim=("special_message", "gift_context"))
+
+GIFTS_TEXT = Template("gifts-text", """Generate {count} gift ideas for {recipient_name} for {occasion}.
+
+Details:
+- Age: {age}
+- Relationship: {relationship}
+- Interests: {interests}
+- Location: {location}
+- Budget: {budget} ({currency})
+- Personality: {personality}
+
+For each gift, provide:
+1. Name
+2. Description (1-2 sentences)
+3. Why it's perfect
+4. Price estimate (MUST use {currency} currency with {symbol} symbol)
+5. Where to buy (consider location: {location})
+
+IMPORTANT: All prices MUST be in {currency} currency using {symbol} symbol.
+Format each gift clearly numbered 1-{count}.""", trim=("personality", "location", "interests"))
+
+GIFTS_STRUCTURED = Template("gifts-structured", """Suggest {count} {occasion} gifts for {recipient_name}.
+Age: {age}; relationship: {relationship}; interests: {interests}; location: {location}; budget: {budget} {currency}; personality: {personality}.
+Reply with a JSON array of {count} objects with keys: name; description (max 25 words); reason (why it fits, max 15 words); price_range ({symbol} prices in {currency}); where_to_buy (max 8 words).""", trim=("personality", "location", "interests"))
+
+GIFTS_BATCH = Template("gifts-batch", """Suggest {count} gifts for each recipient below.
+{recipients}
+Reply with a JSON object mapping each recipient number (as a string, without #) to an array of {count} objects with keys: name; description (max 25 words); reason (why it fits, max 15 words); price_range (in the recipient's currency, with its symbol); where_to_buy (max 8 words).""")
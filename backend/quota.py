@@ -0,0 +1,102 @@
+"""
+Per-client quotas and sliding-window rate limits.
+
+Usage is recorded as timestamped events in SQLite. A check-and-consume runs
+inside one BEGIN IMMEDIATE transaction, so it stays atomic when several
+uvicorn workers (or processes on the same host) share the database file.
+A window of 0 means the quota never expires on its own and only an
+explicit reset clears it. That is how the free message allowance works.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import storage
+
+# Only keys issued here identify a client; any other X-API-Key is ignored
+API_KEYS = {key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()}
+# Proxies in front of the app (Render: 1); 0 = X-Forwarded-For is not trusted
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_events (
+    bucket TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quota_events ON quota_events (bucket, client_id, ts);
+"""
+
+
+def client_id(http_request):
+    """Identify the caller: a configured API key, else the client IP"""
+    api_key = http_request.headers.get("x-api-key")
+    if api_key and api_key in API_KEYS:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    forwarded = http_request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_HOPS:
+        # Each trusted proxy appends the address it saw; anything further left is client-supplied
+        hops = [part.strip() for part in forwarded.split(",") if part.strip()]
+        if hops:
+            return "ip:" + hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return "ip:" + (http_request.client.host if http_request.client else "unknown")
+
+
+class QuotaStore:
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = storage.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def consume(self, bucket, client, limit, window=0):
+        """Record one use if under `limit`; returns (allowed, used_after)"""
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if window:
+                    conn.execute(
+                        "DELETE FROM quota_events WHERE bucket = ? AND client_id = ? AND ts <= ?",
+                        (bucket, client, now - window),
+                    )
+                (used,) = conn.execute(
+                    "SELECT COUNT(*) FROM quota_events WHERE bucket = ? AND client_id = ?",
+                    (bucket, client),
+                ).fetchone()
+                allowed = used < limit
+                if allowed:
+                    conn.execute(
+                        "INSERT INTO quota_events (bucket, client_id, ts) VALUES (?, ?, ?)",
+                        (bucket, client, now),
+                    )
+                    used += 1
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return allowed, used
+
+    def usage(self, bucket, client, window=0):
+        since = time.time() - window if window else 0
+        with self._lock:
+            (used,) = self.conn.execute(
+                "SELECT COUNT(*) FROM quota_events WHERE bucket = ? AND client_id = ? AND ts > ?",
+                (bucket, client, since),
+            ).fetchone()
+        return used
+
+    def reset(self, bucket, client):
+        with self._lock:
+            self.conn.execute("DELETE FROM quota_events WHERE bucket = ? AND client_id = ?", (bucket, client))
+
+
+quota_store = QuotaStore()
@@ -0,0 +1,163 @@
+"""
+Failure handling for upstream model calls: deadlines, retries with
+jittered backoff, a circuit breaker and hedged requests.
+
+Errors that reach the handlers are LLMUnavailable, carrying the HTTP status
+to answer with (503 or 504) and a Retry-After hint. A raw 500 with the SDK
+message is no longer the only outcome.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_MIN_SAMPLES = 20
+
+# Seconds a whole call (all attempts included) may take, per endpoint
+DEFAULT_DEADLINE = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+DEADLINES = {
+    "photo-caption": 12,
+    "generate-message": 15,
+    "generate-gifts": 25,
+    "generate-gifts/batch": 40,
+    "generate-card": 20,
+    "create-wishlist": 40,
+    "party-planner": 60,
+    "test": 10,
+}
+
+# SDK / gRPC / HTTP errors worth another attempt. Matched by name so this
+# module doesn't need to import google.api_core.
+RETRYABLE_NAMES = {
+    "ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted", "InternalServerError",
+    "TooManyRequests", "GatewayTimeout", "BadGateway", "Aborted", "Unavailable", "RetryError",
+}
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def deadline_for(route):
+    return DEADLINES.get(route, DEFAULT_DEADLINE)
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_NAMES:
+        return True
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    return getattr(code, "value", code) in RETRYABLE_CODES
+
+
+def backoff_delay(attempt):
+    """Full jitter: uniform between 0 and the capped exponential step"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; one probe is let through after `cooldown`"""
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            retry_after = max(1, int(self.cooldown - (time.monotonic() - self.opened_at)))
+            raise LLMUnavailable("AI service is temporarily unavailable, please retry shortly",
+                                 status_code=503, retry_after=retry_after)
+        if state == "half-open":
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def abort(self):
+        """A probe was cancelled before it told us anything"""
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class LatencyTracker:
+    """Recent successful call latencies per route, for the hedging threshold"""
+
+    def __init__(self, size=200):
+        self.size = size
+        self.samples = {}
+
+    def record(self, route, seconds):
+        self.samples.setdefault(route, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, route, pct):
+        samples = self.samples.get(route)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def first_success(make_call, timeout, hedge_after=None, on_hedge=None):
+    """
+    Await make_call() within `timeout`. With `hedge_after`, start a second
+    identical call if the first hasn't answered by then and return
+    whichever succeeds first.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = {asyncio.ensure_future(make_call())}
+    hedged = hedge_after is None or hedge_after >= timeout
+    error = None
+    try:
+        while tasks:
+            wait = deadline - loop.time() if hedged else min(hedge_after, deadline - loop.time())
+            if wait <= 0:
+                raise asyncio.TimeoutError()
+            done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not done and not hedged:
+                hedged = True
+                if on_hedge is not None:
+                    on_hedge()
+                tasks.add(asyncio.ensure_future(make_call()))
+            elif not done:
+                raise asyncio.TimeoutError()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,118 @@
+"""
+Secret Santa assignment solver.
+
+Everyone first goes around one random cycle (giver i -> giver i+1). That
+is already a valid derangement unless an excluded pair ended up next to
+each other. Those few givers are then re-matched with augmenting paths
+over the implicit "allowed" graph (everyone minus self and exclusions).
+
+If no augmenting path exists for some giver, no valid assignment exists
+at all, so the answer is exact rather than "gave up after N shuffles".
+The same seed gives the same draw.
+"""
+import random
+from collections import deque
+
+
+# Random swaps tried before falling back to the exhaustive search
+SWAP_PROBES = 32
+
+
+class NoValidAssignment(Exception):
+    pass
+
+
+def _blocked_sets(names, exclude_pairs):
+    """giver index -> receiver indexes it may not draw (only for givers with exclusions)"""
+    index = {name: i for i, name in enumerate(names)}
+    blocked = {}
+    for pair in exclude_pairs or []:
+        # A "pair" may list more than two names; none of them can draw each other
+        members = {index[name] for name in pair if name in index}
+        if len(members) > 1:
+            for a in members:
+                excluded = blocked.get(a)
+                if excluded is None:
+                    blocked[a] = excluded = set()
+                excluded.update(members)
+    return blocked
+
+
+def _allowed(giver, receiver, blocked):
+    return giver != receiver and receiver not in blocked.get(giver, ())
+
+
+def _augment(giver, match, owner, blocked, free_receivers, rng):
+    """Re-match an unassigned giver along an augmenting path; False if there is none"""
+    # Cheap case first: a free receiver this giver is allowed to draw
+    for receiver in free_receivers:
+        if _allowed(giver, receiver, blocked):
+            match[giver] = receiver
+            owner[receiver] = giver
+            free_receivers.remove(receiver)
+            return True
+
+    # With sparse exclusions a random two-way swap almost always works:
+    # take someone else's receiver and hand them a free one instead
+    n = len(owner)
+    for _ in range(SWAP_PROBES):
+        receiver = rng.randrange(n)
+        holder = owner[receiver]
+        if holder is None or not _allowed(giver, receiver, blocked):
+            continue
+        for free in free_receivers:
+            if _allowed(holder, free, blocked):
+                match[giver], owner[receiver] = receiver, giver
+                match[holder], owner[free] = free, holder
+                free_receivers.remove(free)
+                return True
+
+    # BFS over the implicit graph. Every receiver is visited at most once, and
+    # a scan only skips receivers the current giver is blocked from, so one
+    # search costs O(n + exclusions).
+    unvisited = set(range(n))
+    came_from = {}
+    queue = deque([giver])
+    while queue:
+        g = queue.popleft()
+        excluded = blocked.get(g, ())
+        reachable = [r for r in unvisited if r != g and r not in excluded]
+        for r in reachable:
+            unvisited.discard(r)
+            came_from[r] = g
+            if owner[r] is None:
+                free_receivers.remove(r)
+                # Walk back, moving each giver on the path to the receiver after it
+                while r is not None:
+                    g = came_from[r]
+                    previous = match[g]
+                    match[g] = r
+                    owner[r] = g
+                    r = previous
+                return True
+            queue.append(owner[r])
+    return False
+
+
+def assign_secret_santa(names, exclude_pairs=None, seed=None):
+    """Return a list of (giver, receiver) pairs, or raise NoValidAssignment"""
+    n = len(names)
+    rng = random.Random(seed)
+    blocked = _blocked_sets(names, exclude_pairs)
+
+    order = list(range(n))
+    rng.shuffle(order)
+    match = [None] * n   # giver -> receiver
+    owner = [None] * n   # receiver -> giver
+    for k, giver in enumerate(order):
+        receiver = order[(k + 1) % n]
+        if _allowed(giver, receiver, blocked):
+            match[giver] = receiver
+            owner[receiver] = giver
+
+    free_receivers = {r for r in range(n) if owner[r] is None}
+    for giver in order:
+        if match[giver] is None and not _augment(giver, match, owner, blocked, free_receivers, rng):
+            raise NoValidAssignment()
+
+    return [(names[g], names[match[g]]) for g in range(n)]
@@ -0,0 +1,103 @@
+"""
+In-memory static asset pipeline for the frontend.
+
+Each asset is read once, hashed, and precompressed with gzip (and brotli
+when the `brotli` package is installed). Responses negotiate the encoding
+from Accept-Encoding and carry a strong ETag per encoding. If-None-Match
+gets a 304. genz.html inlines its script, so there are no versioned asset
+URLs to cache forever; every response is revalidated on use.
+"""
+import gzip
+import hashlib
+from pathlib import Path
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+FRONTEND_DIR = Path(__file__).parent.parent / "frontend"
+ASSETS = {"genz.html": "text/html; charset=utf-8", "app.js": "application/javascript; charset=utf-8"}
+REVALIDATE = "no-cache"
+# Skip compressing tiny files; the headers would outweigh the savings
+MIN_COMPRESS_SIZE = 1024
+
+
+class Asset:
+    def __init__(self, name, content_type, body):
+        self.name = name
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encodings = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings["br"] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding):
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest}{suffix}"'
+
+
+_assets = {}
+
+
+def load(names=None):
+    """Read and precompress the frontend files; called once at startup"""
+    for name in names or ASSETS:
+        path = FRONTEND_DIR / name
+        if path.exists():
+            _assets[name] = Asset(name, ASSETS.get(name, "application/octet-stream"), path.read_bytes())
+
+
+def get(name):
+    if not _assets:
+        load()
+    return _assets.get(name)
+
+
+def choose_encoding(accept_encoding, available):
+    """Pick br, then gzip, then identity, honouring q=0 exclusions"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    for coding in ("br", "gzip"):
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if coding in available and q > 0:
+            return coding
+    return "identity"
+
+
+def _etag_matches(if_none_match, asset):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(asset.etag(encoding) in tags for encoding in asset.encodings)
+
+
+def asset_response(asset, request):
+    encoding = choose_encoding(request.headers.get("accept-encoding"), asset.encodings)
+    headers = {
+        "ETag": asset.etag(encoding),
+        "Cache-Control": REVALIDATE,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), asset):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.encodings[encoding], media_type=asset.content_type, headers=headers)
@@ -0,0 +1,19 @@
+"""
+SQLite helpers shared by the on-disk stores.
+
+Connections use WAL mode so several uvicorn workers can read while one
+writes. APP_DB_PATH points every store at the same file by default.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_DB_PATH = os.getenv("APP_DB_PATH", str(Path(__file__).parent / "app.db"))
+
+
+def connect(path=None):
+    """Open a connection that is safe to share across the event loop and executor threads"""
+    conn = sqlite3.connect(path or DEFAULT_DB_PATH, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,41 @@
+"""
+Server-Sent Events helpers for the long-form endpoints.
+
+A stream sends one `meta` event straight away (the same fields as the JSON
+response minus the generated text), then `chunk` events as the model
+produces text, and finally `done` with the complete text, or `error`.
+"""
+from fastapi.responses import StreamingResponse
+
+from api_responses import dumps
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+async def single_chunk(text):
+    yield text
+
+
+def sse_response(chunks, meta, result_key, on_complete=None):
+    """Wrap an async iterator of text chunks into a text/event-stream response"""
+
+    async def events():
+        yield sse_event("meta", meta)
+        parts = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event("chunk", {"text": chunk})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        text = "".join(parts).strip()
+        if on_complete is not None:
+            on_complete(text)
+        yield sse_event("done", {**meta, result_key: text})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
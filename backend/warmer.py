@@ -0,0 +1,200 @@
+"""
+Background pre-warming of the response cache for popular requests.
+
+Every cached lookup on a registered endpoint is counted per request shape
+(the normalized response cache key: casing, interest order and budget
+buckets already folded together) in a Space-Saving sketch, which keeps
+approximate counts for the WARMER_TRACKED most frequent shapes in fixed
+memory. Counts are halved every WARMER_DECAY_SECONDS so last week's
+favourites fade.
+
+Every WARMER_INTERVAL seconds, if no LLM call is running or queued
+(admission.busy()), the warmer regenerates the top WARMER_TOP_K shapes
+that are missing from the cache or within WARMER_REFRESH_FRACTION of
+expiring, spending at most WARMER_CALL_BUDGET upstream calls per hour.
+Peak traffic then finds those responses cached instead of queueing for
+the model.
+
+Endpoints register how to rebuild a request from its payload, its cache
+key, and how to generate and store its response, like job handlers do.
+"""
+import asyncio
+import heapq
+import os
+import time
+
+import admission
+import metrics
+from cache import DEFAULT_TTL, response_cache
+from logs import get_logger
+
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "1") == "1"
+WARMER_TRACKED = int(os.getenv("WARMER_TRACKED", "500"))
+WARMER_TOP_K = int(os.getenv("WARMER_TOP_K", "50"))
+WARMER_MIN_COUNT = int(os.getenv("WARMER_MIN_COUNT", "3"))  # lookups before a shape is worth warming
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", "30"))
+WARMER_CALL_BUDGET = int(os.getenv("WARMER_CALL_BUDGET", "60"))  # upstream calls per hour
+WARMER_REFRESH_FRACTION = float(os.getenv("WARMER_REFRESH_FRACTION", "0.2"))
+WARMER_DECAY_SECONDS = float(os.getenv("WARMER_DECAY_SECONDS", "3600"))
+BUDGET_WINDOW = 3600
+
+log = get_logger("warmer")
+
+lookups = metrics.Counter("warmer_lookups_total",
+                          "Cache lookups on warmed endpoints: warm_hit (served from a pre-generated entry), hit, miss",
+                          ("endpoint", "result"))
+warm_calls = metrics.Counter("warmer_calls_total", "Upstream calls spent pre-generating responses",
+                             ("endpoint", "outcome"))
+
+
+class SpaceSaving:
+    """Approximate top-k counter in fixed memory (Metwally et al.): counts may overestimate by `errors`"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, weight=1):
+        """Count key; returns the key evicted to make room, if any"""
+        if key in self.counts:
+            self.counts[key] += weight
+            return None
+        evicted = None
+        floor = 0
+        if len(self.counts) >= self.capacity:
+            evicted = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(evicted)
+            del self.errors[evicted]
+        self.counts[key] = floor + weight
+        self.errors[key] = floor
+        return evicted
+
+    def top(self, k):
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+    def decay(self, factor=0.5):
+        for key in self.counts:
+            self.counts[key] *= factor
+            self.errors[key] *= factor
+
+
+class Warmer:
+    def __init__(self, tracked=WARMER_TRACKED, top_k=WARMER_TOP_K, budget=WARMER_CALL_BUDGET):
+        self.sketch = SpaceSaving(tracked)
+        self.top_k = top_k
+        self.budget = budget
+        self.endpoints = {}
+        # (endpoint, key) -> latest request payload for that shape
+        self.payloads = {}
+        # Shapes whose cached entry the warmer wrote and nobody has regenerated since
+        self.warmed = set()
+        self.spent = 0
+        self._window_start = time.monotonic()
+        self._last_decay = time.monotonic()
+        self._task = None
+
+    def register(self, endpoint, request_type, cache_key, generate):
+        """generate(request) -> awaitable that makes the response and stores it in response_cache"""
+        self.endpoints[endpoint] = (request_type, cache_key, generate)
+
+    def record(self, endpoint, request, key, hit):
+        shape = (endpoint, key)
+        evicted = self.sketch.add(shape)
+        if evicted is not None:
+            self.payloads.pop(evicted, None)
+            self.warmed.discard(evicted)
+        self.payloads[shape] = request.model_dump()
+        if hit:
+            lookups.inc(endpoint=endpoint, result="warm_hit" if shape in self.warmed else "hit")
+        else:
+            self.warmed.discard(shape)
+            lookups.inc(endpoint=endpoint, result="miss")
+
+    def budget_left(self):
+        now = time.monotonic()
+        if now - self._window_start >= BUDGET_WINDOW:
+            self._window_start, self.spent = now, 0
+        return self.budget - self.spent
+
+    def due(self):
+        """Popular shapes that are missing from the cache or about to expire, most popular first"""
+        found = []
+        for shape, count in self.sketch.top(self.top_k):
+            endpoint = shape[0]
+            if count < WARMER_MIN_COUNT or endpoint not in self.endpoints or shape not in self.payloads:
+                continue
+            request_type, cache_key, _ = self.endpoints[endpoint]
+            request = request_type(**self.payloads[shape])
+            # The key can move on (month bucket) since the shape was counted
+            left = response_cache.ttl_left(endpoint, cache_key(request))
+            if left is None or left < WARMER_REFRESH_FRACTION * response_cache.ttls.get(endpoint, DEFAULT_TTL):
+                found.append((shape, request))
+        return found
+
+    async def run_once(self):
+        """Warm what is due while upstream is idle and budget remains; returns calls spent"""
+        spent = 0
+        for shape, request in self.due():
+            if admission.busy() or self.budget_left() <= 0:
+                break
+            endpoint = shape[0]
+            self.spent += 1
+            spent += 1
+            try:
+                await self.endpoints[endpoint][2](request)
+            except Exception as e:
+                warm_calls.inc(endpoint=endpoint, outcome="error")
+                log.warning("warm_failed", endpoint=endpoint, error=str(e))
+                continue
+            warm_calls.inc(endpoint=endpoint, outcome="ok")
+            self.warmed.add(shape)
+        if spent:
+            log.info("cache_warmed", calls=spent, budget_left=self.budget_left())
+        return spent
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(WARMER_INTERVAL)
+            if time.monotonic() - self._last_decay >= WARMER_DECAY_SECONDS:
+                self._last_decay = time.monotonic()
+                self.sketch.decay()
+            if admission.busy():
+                continue
+            try:
+                await self.run_once()
+            except Exception as e:
+                log.warning("warmer_failed", error=str(e))
+
+    async def start(self):
+        if WARMER_ENABLED and self.budget > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def snapshot(self):
+        return {
+            "enabled": self._task is not None,
+            "tracked_shapes": len(self.sketch.counts),
+            "warmed_shapes": len(self.warmed),
+            "budget": self.budget,
+            "budget_left": self.budget_left(),
+            "top": [{"endpoint": endpoint, "count": round(count, 1), "warmed": (endpoint, key) in self.warmed}
+                    for (endpoint, key), count in self.sketch.top(10)],
+        }
+
+
+warmer = Warmer()
+
+
+def _collect():
+    yield ("warmer_budget_spent", "gauge", "Upstream calls the warmer spent in the current hour",
+           [({}, warmer.budget - warmer.budget_left())])
+    yield "warmer_tracked_shapes", "gauge", "Request shapes counted by the warmer", [({}, len(warmer.sketch.counts))]
+
+
+metrics.register_collector(_collect)
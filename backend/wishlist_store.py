@@ -0,0 +1,147 @@
+"""
+Shared wishlists stored in SQLite, so share_url links resolve.
+
+A wishlist is written once with its AI suggestions and then only read, so
+reads go through an in-memory LRU in front of the table: a popular link
+costs neither a model call nor a query. Ids are short random base62
+strings; a collision on insert just draws a new id.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import string
+import threading
+import time
+
+import metrics
+import storage
+from cache import LRUCache
+
+WISHLIST_ID_LENGTH = 8
+WISHLIST_CACHE_SIZE = int(os.getenv("WISHLIST_CACHE_SIZE", "1024"))
+WISHLIST_CACHE_TTL = int(os.getenv("WISHLIST_CACHE_TTL", "3600"))
+ID_ATTEMPTS = 5
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wishlists (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    items TEXT NOT NULL,
+    occasion TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    recipient_key TEXT NOT NULL,
+    privacy TEXT NOT NULL,
+    ai_suggestions TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_wishlists_recipient ON wishlists (recipient_key, created_at);
+"""
+
+_COLUMNS = "id, title, items, occasion, recipient, privacy, ai_suggestions, created_at"
+
+
+class WishlistNotFound(KeyError):
+    pass
+
+
+def new_id(length=WISHLIST_ID_LENGTH):
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(length))
+
+
+def _recipient_key(recipient):
+    return " ".join(recipient.lower().split())
+
+
+def _row_to_dict(row):
+    wishlist_id, title, items, occasion, recipient, privacy, ai_suggestions, created_at = row
+    return {
+        "wishlist_id": wishlist_id,
+        "title": title,
+        "items": json.loads(items),
+        "occasion": occasion,
+        "recipient": recipient,
+        "privacy": privacy,
+        "ai_suggestions": ai_suggestions,
+        "created_at": created_at,
+    }
+
+
+class WishlistStore:
+    def __init__(self, path=None, cache_size=WISHLIST_CACHE_SIZE):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.cache = LRUCache(cache_size)
+        self.stats = {"hits": 0, "misses": 0, "id_collisions": 0}
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = storage.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def create(self, title, items, occasion, recipient, privacy="public", ai_suggestions=None):
+        """Store a wishlist and return its id"""
+        row = [None, title, json.dumps(items), occasion, recipient, _recipient_key(recipient), privacy,
+               ai_suggestions, time.time()]
+        for _ in range(ID_ATTEMPTS):
+            row[0] = new_id()
+            try:
+                with self._lock:
+                    self.conn.execute(
+                        "INSERT INTO wishlists (id, title, items, occasion, recipient, recipient_key, privacy,"
+                        " ai_suggestions, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        row,
+                    )
+                return row[0]
+            except sqlite3.IntegrityError:
+                self.stats["id_collisions"] += 1
+        raise RuntimeError("Could not allocate a unique wishlist id")
+
+    def set_suggestions(self, wishlist_id, ai_suggestions):
+        with self._lock:
+            self.conn.execute("UPDATE wishlists SET ai_suggestions = ? WHERE id = ?", (ai_suggestions, wishlist_id))
+        self.cache.pop(wishlist_id)
+
+    def get(self, wishlist_id):
+        wishlist = self.cache.get(wishlist_id)
+        if wishlist is not None:
+            self.stats["hits"] += 1
+            return wishlist
+        self.stats["misses"] += 1
+        with self._lock:
+            row = self.conn.execute(f"SELECT {_COLUMNS} FROM wishlists WHERE id = ?", (wishlist_id,)).fetchone()
+        if row is None:
+            raise WishlistNotFound(wishlist_id)
+        wishlist = _row_to_dict(row)
+        # Suggestions still streaming: don't pin the incomplete row in the cache
+        if wishlist["ai_suggestions"] is not None:
+            self.cache.set(wishlist_id, wishlist, WISHLIST_CACHE_TTL)
+        return wishlist
+
+    def for_recipient(self, recipient, limit=20):
+        """Newest public wishlists for a recipient (case and spacing insensitive); internal lookups only, not exposed over HTTP"""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM wishlists WHERE recipient_key = ? AND privacy = 'public'"
+                " ORDER BY created_at DESC LIMIT ?",
+                (_recipient_key(recipient), limit),
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+
+wishlist_store = WishlistStore()
+
+
+def _collect():
+    stats = wishlist_store.stats
+    yield ("wishlist_lookups_total", "counter", "Wishlist reads served from memory (hits) or SQLite (misses)",
+           [({"result": "hits"}, stats["hits"]), ({"result": "misses"}, stats["misses"])])
+    yield "wishlist_id_collisions_total", "counter", "Wishlist ids redrawn after a collision", [({}, stats["id_collisions"])]
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+/budget-tracker (JSON, pydantic items) vs. /budget-tracker/bulk (streamed CSV/NDJSON).
+
+Requests are sent in-process through the ASGI app, so the timings cover
+request parsing, aggregation and response serialization. With --memory
+peak Python allocations are traced as well (slower).
+
+    python benchmarks/budget_bulk.py
+    python benchmarks/budget_bulk.py --sizes 1000 100000 1000000 --skip-json-above 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+
+import main
+from limits import MAX_BUDGET_ITEMS
+
+CATEGORIES = ["gifts", "food", "decorations", "travel", "cards", "wrapping"]
+RECIPIENTS = [None, "Mom", "Dad", "Sam", "Alex", "Team"]
+
+
+def make_items(n, seed=7):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {
+            "name": f"item-{i}",
+            "category": rng.choice(CATEGORIES),
+            "planned_amount": round(rng.uniform(5, 200), 2),
+            "actual_amount": round(rng.uniform(5, 200), 2) if rng.random() < 0.7 else None,
+            "recipient": rng.choice(RECIPIENTS),
+        }
+
+
+def payloads(n):
+    items = list(make_items(n))
+    as_json = json.dumps({"total_budget": 50000.0, "items": items}).encode()
+    csv_lines = ["name,category,planned_amount,actual_amount,recipient"]
+    for it in items:
+        csv_lines.append(f"{it['name']},{it['category']},{it['planned_amount']},"
+                         f"{it['actual_amount'] if it['actual_amount'] is not None else ''},{it['recipient'] or ''}")
+    as_csv = ("\n".join(csv_lines) + "\n").encode()
+    as_ndjson = ("\n".join(json.dumps(it) for it in items) + "\n").encode()
+    return as_json, as_csv, as_ndjson
+
+
+async def timed(client, trace, url, body, content_type):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = await client.post(url, content=body, headers={"content-type": content_type})
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+    response.raise_for_status()
+    return elapsed, len(response.content), peak
+
+
+async def main_async(args):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'items':>9} {'path':>12} {'seconds':>8} {'resp_bytes':>11} {'peak_mb':>8}")
+        for n in args.sizes:
+            as_json, as_csv, as_ndjson = payloads(n)
+            cases = [
+                ("bulk-csv", "/budget-tracker/bulk?total_budget=50000", as_csv, "text/csv"),
+                ("bulk-ndjson", "/budget-tracker/bulk?total_budget=50000", as_ndjson, "application/x-ndjson"),
+            ]
+            if n <= args.skip_json_above:
+                cases.insert(0, ("json", "/budget-tracker", as_json, "application/json"))
+            for label, url, body, content_type in cases:
+                elapsed, size, peak = await timed(client, args.memory, url, body, content_type)
+                peak_mb = f"{peak / 1e6:.1f}" if peak is not None else "-"
+                print(f"{n:>9} {label:>12} {elapsed:>8.3f} {size:>11} {peak_mb:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--skip-json-above", type=int, default=MAX_BUDGET_ITEMS,
+                        help="don't run the JSON endpoint for sizes above this (it rejects more than LIMIT_BUDGET_ITEMS)")
+    parser.add_argument("--memory", action="store_true", help="trace peak allocations")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Wall-clock time for gift ideas for N recipients: one /generate-gifts call
+per recipient in sequence (what the frontend does today) vs. a single
+/generate-gifts/batch request.
+
+The fake model answers any prompt in JSON. Its latency is a fixed
+time-to-first-token plus a per-recipient generation time, so packing
+several recipients into one prompt is not free.
+
+    python benchmarks/gift_batch.py
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+
+import llm
+import main
+from fake_model import FakeResponse
+
+GIFT = {"name": "Cozy Blanket", "description": "Soft fleece throw.", "reason": "Warm winter nights.",
+        "price_range": "$30-$45", "where_to_buy": "Target"}
+
+
+class JSONFakeModel:
+    model_name = "models/fake-json"
+
+    def __init__(self, first_token, per_recipient):
+        self.first_token = first_token
+        self.per_recipient = per_recipient
+
+    async def generate_content_async(self, prompt, **kwargs):
+        indexes = [int(i) for i in re.findall(r"^#(\d+):", prompt, flags=re.M)]
+        await asyncio.sleep(self.first_token + self.per_recipient * max(1, len(indexes)))
+        if indexes:
+            return FakeResponse(json.dumps({str(i): [GIFT] * 3 for i in indexes}))
+        return FakeResponse(json.dumps([GIFT] * 3))
+
+
+def recipients(n):
+    return [{"recipient_name": f"Person {i}", "relationship": "family", "interests": ["books", f"hobby-{i}"]}
+            for i in range(n)]
+
+
+async def main_async(args):
+    llm.use_model(JSONFakeModel(args.first_token, args.per_recipient))
+    headers = {"Cache-Control": "no-store"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'recipients':>10} {'sequential_s':>12} {'batch_s':>8} {'upstream_calls':>14}")
+        for n in args.sizes:
+            people = recipients(n)
+            start = time.perf_counter()
+            for person in people:
+                (await client.post("/generate-gifts", json=person, headers=headers)).raise_for_status()
+            sequential = time.perf_counter() - start
+
+            calls_before = llm.stats["upstream_calls"]
+            start = time.perf_counter()
+            response = await client.post("/generate-gifts/batch", json={"requests": people}, headers=headers)
+            response.raise_for_status()
+            batch = time.perf_counter() - start
+            assert response.text.count("event: gifts") == n
+            calls = llm.stats["upstream_calls"] - calls_before
+            print(f"{n:>10} {sequential:>12.2f} {batch:>8.2f} {calls:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--first-token", type=float, default=0.6, help="seconds before the first token")
+    parser.add_argument("--per-recipient", type=float, default=0.8, help="seconds of output per recipient")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Structured (JSON) vs. free-text gift generation, measured on recorded replies.
+
+For each mode it reports prompt and output tokens (estimated at ~4 chars
+per token), parse time, parse success rate and the expected end-to-end
+latency including the retries users make after a bad parse. Generation
+time is modelled as FIRST_TOKEN_S + output_tokens / TOKENS_PER_S.
+
+    python benchmarks/gift_parsing.py
+"""
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from main import GiftRequest
+from gifts import parse_gifts, structured_prompt, text_prompt
+
+FIXTURES = Path(__file__).parent / "fixtures" / "gift_responses.json"
+FIRST_TOKEN_S = 0.6
+TOKENS_PER_S = 180.0
+LABELS = ("description:", "why", "price", "where to buy", "buy at:")
+
+REQUEST = GiftRequest(
+    recipient_name="Mom", relationship="mother", age=58, interests=["cooking", "gardening"],
+    budget_min=20, budget_max=100, location="Austin, TX", personality="warm",
+)
+
+
+def tokens(text):
+    return max(1, len(text) // 4)
+
+
+def well_formed(gifts):
+    """Three gifts, every field filled from the reply, and no field holding another field's label"""
+    if len(gifts) < 3:
+        return False
+    for gift in gifts[:3]:
+        if any(not gift.get(field) for field in ("name", "description", "reason", "price_range", "where_to_buy")):
+            return False
+        if not any(ch.isdigit() for ch in gift["price_range"]):
+            return False
+        if any(gift[field].lower().lstrip("*- ").startswith(LABELS) for field in ("description", "reason")):
+            return False
+    return True
+
+
+def run(mode, replies, prompt):
+    structured = mode == "json"
+    parse_times, output_tokens, successes = [], [], 0
+    for reply in replies:
+        start = time.perf_counter()
+        for _ in range(200):
+            gifts, _ = parse_gifts(reply, structured=structured)
+        parse_times.append((time.perf_counter() - start) / 200)
+        output_tokens.append(tokens(reply))
+        successes += well_formed(gifts)
+
+    success_rate = successes / len(replies)
+    mean_out = statistics.mean(output_tokens)
+    latency = FIRST_TOKEN_S + mean_out / TOKENS_PER_S
+    expected_calls = 1 / success_rate if success_rate else float("inf")
+    return {
+        "mode": mode,
+        "prompt_tokens": tokens(prompt),
+        "output_tokens": round(mean_out),
+        "parse_us": round(statistics.mean(parse_times) * 1e6, 1),
+        "success_rate": round(success_rate, 2),
+        "latency_s": round(latency, 2),
+        "expected_calls": round(expected_calls, 2),
+        "effective_latency_s": round(latency * expected_calls, 2),
+    }
+
+
+def main():
+    corpus = json.loads(FIXTURES.read_text(encoding="utf-8"))
+    rows = [
+        run("text", corpus["text"], text_prompt(REQUEST)),
+        run("json", corpus["json"], structured_prompt(REQUEST)),
+    ]
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(row[c])) for row in rows)) for c in columns]
+    print("  ".join(f"{c:>{w}}" for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>{w}}" for c, w in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Reproducible load suite for every endpoint, fully offline.
+
+Runs the app in-process (httpx + ASGI transport) with LLM_BACKEND=fake, so
+Gemini is replaced by the replay model in backend/fake_model.py: recorded
+responses from backend/fake_responses.json with a seeded latency
+distribution. Every request sends Cache-Control: no-store so the response
+cache doesn't hide the LLM path. For each scenario and concurrency level it
+reports throughput, p50/p95/p99 latency and errors, plus peak RSS and
+Python heap for the whole run.
+
+    python benchmarks/load_suite.py
+    python benchmarks/load_suite.py --levels 1 8 32 --requests 64 --output baseline.json
+    python benchmarks/load_suite.py --compare baseline.json   # diff against a saved run
+
+Latency model: --latency takes the same specs as FAKE_LLM_LATENCY, e.g.
+fixed:0.2, uniform:0.1,0.5, normal:0.3,0.05, lognormal:0.8,0.4 (median
+seconds, sigma).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+OUT = sys.stdout
+
+GIFT = {"recipient_name": "Mom", "relationship": "mother", "interests": ["cooking", "gardening"],
+        "budget_min": 50, "budget_max": 100, "currency": "USD", "age": 58}
+
+SCENARIOS = {
+    "generate-gifts": ("POST", "/generate-gifts", GIFT),
+    "generate-gifts/instant": ("POST", "/generate-gifts/instant", GIFT),
+    "generate-gifts/batch": ("POST", "/generate-gifts/batch?stream=false", {"requests": [
+        GIFT,
+        {"recipient_name": "Dad", "relationship": "father", "interests": ["golf"]},
+        {"recipient_name": "Sam", "relationship": "friend", "interests": ["gaming", "coffee"]},
+    ]}),
+    "generate-message": ("POST", "/generate-message",
+                         {"recipient_name": "Alex", "relationship": "friend", "tone": "warm", "is_premium": True}),
+    "photo-caption": ("POST", "/photo-caption",
+                      {"photo_description": "Family around the tree", "occasion": "Christmas", "tone": "fun"}),
+    "generate-card": ("POST", "/generate-card",
+                      {"occasion": "Christmas", "recipient_name": "Grandma", "sender_name": "Sam",
+                       "relationship": "grandmother"}),
+    "party-planner": ("POST", "/party-planner",
+                      {"occasion": "Christmas", "guest_count": 12, "venue_type": "home", "age_group": "mixed"}),
+    "party-planner?stream": ("POST", "/party-planner?stream=true",
+                             {"occasion": "Christmas", "guest_count": 12, "venue_type": "home", "age_group": "mixed"}),
+    "create-wishlist": ("POST", "/create-wishlist",
+                        {"title": "Mia's list", "items": ["headphones", "sketchbook"], "recipient_name": "Mia"}),
+    "secret-santa": ("POST", "/secret-santa", {"names": [f"p{i}" for i in range(50)]}),
+    "budget-tracker": ("POST", "/budget-tracker", {
+        "total_budget": 500, "currency": "USD",
+        "items": [{"name": f"gift {i}", "category": "gifts", "planned_amount": 10 + i,
+                   "actual_amount": 9 + i, "recipient": f"r{i % 7}"} for i in range(40)],
+    }),
+    "api": ("GET", "/api", None),
+    "index": ("GET", "/", None),
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(client, method, path, body, concurrency, total):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body, headers={"Cache-Control": "no-store"})
+            # Streamed responses are only done once the body has been read
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+async def main_async(args, main):
+    import httpx
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"{'scenario':<22} {'conc':>4} {'reqs':>5} {'err':>4} {'req/s':>8} "
+                  f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}", file=OUT)
+            for name, (method, path, body) in SCENARIOS.items():
+                if args.only and name not in args.only:
+                    continue
+                for concurrency in args.levels:
+                    row = await run_scenario(client, method, path, body, concurrency,
+                                             max(args.requests, concurrency))
+                    results[f"{name}@{concurrency}"] = row
+                    print(f"{name:<22} {concurrency:>4} {row['requests']:>5} {row['errors']:>4} "
+                          f"{row['rps']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}", file=OUT, flush=True)
+    return results
+
+
+def compare(old, new):
+    print(f"\n{'scenario':<27} {'req/s old':>10} {'new':>8} {'diff':>7} {'p95 old':>9} {'new':>8} {'diff':>7}")
+    for key, row in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(key)
+        if not before:
+            print(f"{key:<27} {'-':>10} {row['rps']:>8.1f}")
+            continue
+        rps_diff = (row["rps"] / before["rps"] - 1) * 100 if before["rps"] else 0.0
+        p95_diff = (row["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+        print(f"{key:<27} {before['rps']:>10.1f} {row['rps']:>8.1f} {rps_diff:>+6.0f}% "
+              f"{before['p95_ms']:>9.1f} {row['p95_ms']:>8.1f} {p95_diff:>+6.0f}%")
+    for field in ("peak_rss_mb", "peak_heap_mb"):
+        if field in old.get("memory", {}):
+            print(f"{field}: {old['memory'][field]} -> {new['memory'][field]}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario and level")
+    parser.add_argument("--latency", default="lognormal:0.2,0.3", help="fake model latency spec")
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="run a subset of scenarios")
+    parser.add_argument("--output", help="write results as JSON (a baseline for --compare)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output run")
+    args = parser.parse_args()
+
+    # The backend reads these at import time, so set them before importing main
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = args.latency
+    os.environ["FAKE_LLM_CHUNK_DELAY"] = str(args.chunk_delay)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    scratch = tempfile.mkdtemp(prefix="load-suite-")
+    os.environ["APP_DB_PATH"] = os.path.join(scratch, "app.db")
+    os.environ["CACHE_DB_PATH"] = ""
+    sys.path.insert(0, str(BACKEND))
+
+    import main
+    tracemalloc.start()
+    scenarios = asyncio.run(main_async(args, main))
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    result = {
+        "config": {"levels": args.levels, "requests": args.requests, "latency": args.latency,
+                   "chunk_delay": args.chunk_delay, "seed": args.seed,
+                   "python": platform.python_version(), "platform": platform.platform()},
+        "scenarios": scenarios,
+        "memory": {"peak_rss_mb": round(rss_mb, 1), "peak_heap_mb": round(peak_heap / 1e6, 1)},
+    }
+    print(f"\npeak RSS {result['memory']['peak_rss_mb']} MB, "
+          f"peak Python heap {result['memory']['peak_heap_mb']} MB")
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"wrote {args.output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), result)
+
+
+if __name__ == "__main__":
+    main_cli()
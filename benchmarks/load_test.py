@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Load test for the async LLM layer.
+
+Drives /photo-caption in-process (httpx + ASGI transport) against a fake
+model with a fixed latency, at increasing concurrency levels. With the
+async client throughput should grow roughly linearly with concurrency up
+to LLM_CONCURRENCY; with --blocking the old behaviour (a synchronous
+generate_content call on the event loop) is reproduced for comparison.
+Every request has its own photo description and sends Cache-Control:
+no-store, so neither the response cache nor in-flight coalescing answers
+it without a model call.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --blocking
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+
+import llm
+import main
+from fake_model import FakeModel
+
+PAYLOAD = {"photo_description": "Family around the tree", "occasion": "Christmas", "tone": "fun"}
+_request_ids = itertools.count()
+
+
+async def run_level(client, concurrency, rounds):
+    async def one():
+        payload = {**PAYLOAD, "photo_description": f"{PAYLOAD['photo_description']} #{next(_request_ids)}"}
+        response = await client.post("/photo-caption", json=payload, headers={"Cache-Control": "no-store"})
+        response.raise_for_status()
+
+    total = concurrency * rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return total, elapsed
+
+
+async def main_async(args):
+    llm.use_model(FakeModel(text="Merry and bright! #Christmas", latency=args.latency))
+    if args.blocking:
+        async def blocking_generate_text(prompt, **kwargs):
+            return llm.get_model().generate_content(prompt, **kwargs).text
+        llm.generate_text = blocking_generate_text
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"mode={'blocking' if args.blocking else 'async'} latency={args.latency}s "
+              f"LLM_CONCURRENCY={llm.LLM_CONCURRENCY}")
+        print(f"{'concurrency':>11} {'requests':>8} {'seconds':>8} {'req/s':>8}")
+        for concurrency in args.levels:
+            total, elapsed = await run_level(client, concurrency, args.rounds)
+            print(f"{concurrency:>11} {total:>8} {elapsed:>8.2f} {total / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--blocking", action="store_true", help="reproduce the old synchronous call path")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Secret Santa solver timings for growing groups with random exclusions.
+
+    python benchmarks/secret_santa.py
+    python benchmarks/secret_santa.py --sizes 200 10000 --exclusions-per-person 3
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from secret_santa import assign_secret_santa
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    print(f"{'participants':>12} {'exclusions':>10} {'ms':>8}")
+    for n in args.sizes:
+        names = [f"person-{i}" for i in range(n)]
+        pairs = [rng.sample(names, 2) for _ in range(int(n * args.exclusions_per_person))]
+        start = time.perf_counter()
+        assign_secret_santa(names, pairs, seed=args.seed)
+        print(f"{n:>12} {len(pairs):>10} {(time.perf_counter() - start) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 200, 1000, 10000])
+    parser.add_argument("--exclusions-per-person", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=2024)
+    main(parser.parse_args())
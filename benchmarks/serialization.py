@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+JSON serialization time and bytes on the wire for the largest responses.
+
+The bodies are fetched once from the app (fake model, no API key needed),
+then each is re-encoded many times the three ways a route can go out:
+
+    stdlib   jsonable_encoder + json.dumps (FastAPI's default for plain dicts)
+    orjson   jsonable_encoder + orjson (the app's default response class)
+    model    response_model validation + Pydantic dump_json (modelled routes)
+
+and compressed with gzip and brotli at the levels CompressionMiddleware uses.
+
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --budget-items 10000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0")
+os.environ.setdefault("WARMER_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import api_responses
+import main
+
+CATEGORIES = ["gifts", "food", "decorations", "travel", "cards", "wrapping"]
+RECIPIENTS = [None, "Mom", "Dad", "Sam", "Alex", "Team"]
+
+
+def budget_items(n, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "name": f"item-{i}",
+        "category": rng.choice(CATEGORIES),
+        "planned_amount": round(rng.uniform(5, 200), 2),
+        "actual_amount": round(rng.uniform(5, 200), 2) if rng.random() < 0.7 else None,
+        "recipient": rng.choice(RECIPIENTS),
+    } for i in range(n)]
+
+
+def cases(args):
+    """(label, path, request body, response model)"""
+    gift = {"recipient_name": "Sam", "relationship": "sister", "interests": ["cooking", "books"]}
+    return [
+        ("budget-tracker", "/budget-tracker", {"total_budget": 50000.0, "items": budget_items(args.budget_items)},
+         main.BudgetResponse),
+        ("secret-santa", "/secret-santa", {"names": [f"p{i}" for i in range(args.santa_names)], "seed": 1},
+         main.SecretSantaResponse),
+        ("party-planner", "/party-planner",
+         {"occasion": "Christmas", "guest_count": 20, "venue_type": "home", "age_group": "mixed"},
+         main.PartyPlanResponse),
+        ("create-wishlist", "/create-wishlist",
+         {"title": "Sam's list", "items": [f"wish {i}" for i in range(20)], "recipient_name": "Sam"},
+         main.WishlistResponse),
+        ("generate-gifts", "/generate-gifts/instant?pages=3", gift, main.GiftPage),
+    ]
+
+
+async def fetch(args):
+    transport = httpx.ASGITransport(app=main.app)
+    bodies = []
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for label, path, body, model in cases(args):
+                response = await client.post(path, json=body, headers={"accept-encoding": "identity"})
+                response.raise_for_status()
+                bodies.append((label, response.json(), model))
+    return bodies
+
+
+def per_call(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def encoders(model):
+    adapter = TypeAdapter(model)
+    orjson = api_responses.orjson
+    return {
+        "stdlib": lambda data: json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                                          separators=(",", ":")).encode(),
+        "orjson": (lambda data: orjson.dumps(jsonable_encoder(data))) if orjson is not None else None,
+        "model": lambda data: adapter.dump_json(adapter.validate_python(data), exclude_unset=True),
+    }
+
+
+def main_sync(args):
+    bodies = asyncio.run(fetch(args))
+    print(f"{'response':>16} {'encoder':>7} {'ms':>8} {'bytes':>9}")
+    for label, data, model in bodies:
+        for name, encode in encoders(model).items():
+            if encode is None:
+                print(f"{label:>16} {name:>7} {'-':>8} {'(not installed)':>9}")
+                continue
+            ms = per_call(lambda: encode(data), args.repeat)
+            print(f"{label:>16} {name:>7} {ms:>8.3f} {len(encode(data)):>9}")
+
+    print()
+    print(f"{'response':>16} {'encoding':>8} {'ms':>8} {'bytes':>9} {'ratio':>6}")
+    for label, data, model in bodies:
+        raw = api_responses.dumps(data).encode()
+        print(f"{label:>16} {'identity':>8} {'-':>8} {len(raw):>9} {1:>6.2f}")
+        for encoding in api_responses.ENCODINGS:
+            ms = per_call(lambda: api_responses.compress(raw, encoding), args.repeat)
+            size = len(api_responses.compress(raw, encoding))
+            print(f"{label:>16} {encoding:>8} {ms:>8.3f} {size:>9} {size / len(raw):>6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-items", type=int, default=2000)
+    parser.add_argument("--santa-names", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main_sync(parser.parse_args())
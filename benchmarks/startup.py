@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Cold start: import time and time to first response for non-AI routes.
+
+Each run starts a fresh uvicorn process and polls until the first request
+succeeds, measuring from process spawn. Modes:
+
+  eager   the old behaviour: google.generativeai imported and the model
+          configured before the app is importable
+  lazy    model created on first use, no warm-up (LLM_WARMUP=0)
+  warmup  lazy, plus the background warm-up after startup (the default)
+
+It also prints the heaviest imports of `import main` from -X importtime.
+No API key or network is needed; no request here touches the model.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 5 --path /secret-santa
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+SERVER = """
+import sys, uvicorn
+if {eager}:
+    import google.generativeai as genai
+    genai.configure(api_key="offline")
+    genai.GenerativeModel("models/gemini-2.5-flash")
+import main
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+BODIES = {
+    "/secret-santa": {"names": ["Ann", "Bob", "Cid", "Dee"]},
+    "/budget-tracker": {"total_budget": 100, "items": [{"name": "Mug", "category": "gifts", "planned_amount": 12}]},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_response(mode, path, timeout=60):
+    port = free_port()
+    env = {**os.environ, "LLM_WARMUP": "1" if mode == "warmup" else "0", "LOG_LEVEL": "WARNING",
+           "APP_DB_PATH": os.path.join(os.environ.get("TMPDIR", "/tmp"), f"startup-bench-{port}.db")}
+    body = BODIES.get(path)
+    data = json.dumps(body).encode() if body is not None else None
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER.format(eager=mode == "eager", port=port)],
+                            cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data,
+                                             headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+                    return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"{mode}: no response from {path} within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(env["APP_DB_PATH"] + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def import_profile(top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND,
+                            env={**os.environ, "LOG_LEVEL": "WARNING"}, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    total = next((us for us, name in rows if name.strip() == "main"), 0)
+    print(f"import main: {total / 1000:.0f} ms; top-level imports by cumulative time:")
+    for us, name in sorted((r for r in rows if len(r[1]) - len(r[1].lstrip()) <= 3), reverse=True)[:top]:
+        print(f"  {us / 1000:>8.1f} ms  {name.strip()}")
+    # Whether the Gemini SDK is loaded at all on import
+    loaded = any(name.strip() == "google.generativeai" for _, name in rows)
+    print(f"google.generativeai imported by `import main`: {'yes' if loaded else 'no'}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--path", default="/api", choices=["/api", "/", "/secret-santa", "/budget-tracker"])
+    parser.add_argument("--modes", nargs="+", default=["eager", "lazy", "warmup"])
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    import_profile(args.top)
+    print(f"time to first {args.path} response ({args.runs} runs)")
+    print(f"{'mode':<8} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for mode in args.modes:
+        times = [first_response(mode, args.path) for _ in range(args.runs)]
+        print(f"{mode:<8} {statistics.median(times):>9.2f} {min(times):>7.2f} {max(times):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
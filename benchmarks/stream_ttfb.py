@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-byte for /party-planner, JSON vs. SSE streaming.
+
+Starts uvicorn in-process on a free port with a fake model that replays
+recorded chunks, then measures when the first byte and the full body
+arrive for both response modes.
+
+    python benchmarks/stream_ttfb.py
+"""
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+import uvicorn
+
+import llm
+import main
+from fake_model import FakeModel
+
+PAYLOAD = {"occasion": "Christmas", "guest_count": 12, "venue_type": "home", "age_group": "mixed"}
+CHUNKS = [
+    "🎄 **1. Theme & Decorations**\n- Winter wonderland\n",
+    "🍪 **2. Food & Drinks**\n- Mulled cider\n- Gingerbread\n",
+    "🎲 **3. Activities**\n- Ugly sweater contest\n",
+    "⏰ **4. Timeline**\n- 6pm arrivals\n- 7pm dinner\n",
+    "🛒 **5. Shopping List**\n- Lights, cups, napkins\n",
+]
+
+
+async def measure(client, url):
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", url, json=PAYLOAD) as response:
+        async for _ in response.aiter_raw():
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def main_async(args):
+    llm.use_model(FakeModel(chunks=CHUNKS, chunk_delay=args.chunk_delay, latency=args.chunk_delay * len(CHUNKS)))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        print(f"{'mode':>6} {'ttfb_s':>8} {'total_s':>8}")
+        for mode, url in (("json", "/party-planner"), ("sse", "/party-planner?stream=1")):
+            ttfb, total = await measure(client, url)
+            print(f"{mode:>6} {ttfb:>8.3f} {total:>8.3f}")
+
+    server.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-delay", type=float, default=1.6, help="seconds between recorded chunks")
+    asyncio.run(main_async(parser.parse_args()))
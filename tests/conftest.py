@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+# Offline and quiet: the fake model, no background warmer, fast backoff
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("LLM_WARMUP", "0")
+os.environ.setdefault("WARMER_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LLM_BACKOFF_BASE", "0.01")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import pytest
+
+import llm
+
+
+@pytest.fixture
+def fake():
+    """Pin a FakeModel for every route; breakers, latencies and stats start fresh"""
+    from fake_model import FakeModel
+
+    def use(**kwargs):
+        model = FakeModel(**{"latency": 0, "chunk_delay": 0, **kwargs})
+        llm.use_model(model)
+        return model
+
+    saved = dict(llm.stats)
+    llm.breakers.clear()
+    llm.latencies.samples.clear()
+    for key in llm.stats:
+        llm.stats[key] = 0
+    yield use
+    llm.use_model(None)
+    llm.breakers.clear()
+    llm.latencies.samples.clear()
+    llm.stats.update(saved)
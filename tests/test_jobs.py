@@ -0,0 +1,77 @@
+"""Background jobs: waiting for a busy route and surviving a restart"""
+import asyncio
+
+import admission
+import jobs
+from resilience import LLMUnavailable
+
+
+def busy_gate(route):
+    """A gate with every slot taken and its interactive queue full"""
+    gate = admission.Gate(route, limit=1, max_queue=0, reserved=0)
+    gate.in_flight = 1
+    return gate
+
+
+def test_job_waits_for_a_full_gate():
+    gate = busy_gate("jobs-test")
+
+    async def handler(payload):
+        granted_at = await gate.acquire()
+        gate.release(granted_at)
+        return payload
+
+    async def run():
+        queue = jobs.JobQueue(store=jobs.MemoryJobStore(), workers=1)
+        queue.register("echo", handler)
+        await queue.start()
+        try:
+            # The interactive path fails fast...
+            try:
+                await gate.acquire()
+            except LLMUnavailable as e:
+                rejected = e.status_code
+            # ...while the job waits for the slot
+            job = queue.submit("echo", {"n": 1})
+            await asyncio.sleep(0.05)
+            assert queue.get(job["job_id"])["status"] == "running"
+            gate.release(None)
+            await asyncio.sleep(0.05)
+            return rejected, queue.get(job["job_id"])
+        finally:
+            await queue.stop()
+
+    rejected, job = asyncio.run(run())
+    assert rejected == 429
+    assert job["status"] == "done"
+    assert job["result"] == {"n": 1}
+
+
+def test_memory_store_requeues_on_restart():
+    release = None
+
+    async def handler(payload):
+        await release.wait()
+        return payload
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        queue = jobs.JobQueue(store=jobs.MemoryJobStore(), workers=1)
+        queue.register("slow", handler)
+        await queue.start()
+        running = queue.submit("slow", {"n": 1})
+        waiting = queue.submit("slow", {"n": 2})
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        assert queue.get(running["job_id"])["status"] == "queued"
+
+        await queue.start()
+        release.set()
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        return queue, [queue.get(job["job_id"]) for job in (running, waiting)]
+
+    queue, finished = asyncio.run(run())
+    assert [job["status"] for job in finished] == ["done", "done"]
+    assert queue.depth == {"premium": 0, "free": 0}
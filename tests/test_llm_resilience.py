@@ -0,0 +1,191 @@
+"""Retries, circuit breaker, hedging and error mapping, driven through the fake model"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import llm
+import resilience
+from fake_model import FakeModel, InvalidArgument
+from resilience import LLMUnavailable, first_success
+
+ROUTE = "test"  # no fallback model, so failures surface as they are
+
+
+def breaker(route=ROUTE):
+    return llm.breaker_for(llm.routes.resolve(route).primary.model)
+
+
+def generate(prompt="hello", route=ROUTE):
+    return asyncio.run(llm.generate_text(prompt, route=route))
+
+
+def test_retries_retryable_errors(fake):
+    model = fake(fail_first=2, text="hi")
+    assert generate() == "hi"
+    assert model.calls == 3
+    assert llm.stats["retries"] == 2
+    assert breaker().state == "closed"
+
+
+def test_does_not_retry_other_errors(fake):
+    model = fake(fail_first=1, error=InvalidArgument)
+    with pytest.raises(InvalidArgument):
+        generate()
+    assert model.calls == 1
+    assert llm.stats["retries"] == 0
+    # Upstream answered, so the breaker counts it as healthy
+    assert breaker().failures == 0
+
+
+def test_retries_used_up_is_unavailable(fake, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 1)
+    model = fake(fail_first=5)
+    with pytest.raises(LLMUnavailable) as raised:
+        generate()
+    assert raised.value.status_code == 503
+    assert model.calls == 2
+
+
+def test_breaker_opens_then_rejects(fake, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 0)
+    model = fake(fail_first=100)
+    breaker().threshold = 2
+    for prompt in ("a", "b"):
+        with pytest.raises(LLMUnavailable):
+            generate(prompt)
+    assert breaker().state == "open"
+
+    with pytest.raises(LLMUnavailable) as raised:
+        generate("c")
+    assert raised.value.status_code == 503
+    assert raised.value.retry_after >= 1
+    assert model.calls == 2
+    assert llm.stats["breaker_rejections"] == 1
+
+
+def test_half_open_probe_closes_on_success(fake):
+    model = fake(text="back")
+    tripped = breaker()
+    tripped.cooldown = 0.05
+    tripped.opened_at = time.monotonic() - 1
+    assert tripped.state == "half-open"
+    assert generate() == "back"
+    assert tripped.state == "closed"
+    assert model.calls == 1
+
+
+def test_half_open_probe_reopens_on_failure(fake, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 0)
+    fake(fail_first=1)
+    tripped = breaker()
+    tripped.cooldown = 30
+    tripped.opened_at = time.monotonic() - 31
+    with pytest.raises(LLMUnavailable):
+        generate()
+    assert tripped.state == "open"
+    assert not tripped.probing
+
+
+def test_half_open_lets_one_probe_through(fake):
+    fake(latency=0.1)
+    tripped = breaker()
+    tripped.opened_at = time.monotonic() - tripped.cooldown - 1
+
+    async def run():
+        return await asyncio.gather(llm.generate_text("a", route=ROUTE), llm.generate_text("b", route=ROUTE),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, LLMUnavailable) for r in results) == 1
+    assert tripped.state == "closed"
+
+
+def test_hedges_a_slow_call(fake, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_HEDGE", True)
+    model = fake(latency=0.2, text="slow or not")
+    for _ in range(20):
+        llm.latencies.record(ROUTE, 0.01)
+    assert generate() == "slow or not"
+    assert model.calls == 2
+    assert llm.stats["hedged_calls"] == 1
+
+
+def test_first_success_returns_the_faster_call():
+    models = iter([FakeModel(latency=0.5, text="first"), FakeModel(latency=0.01, text="hedge")])
+    hedges = []
+
+    async def run():
+        call = lambda: next(models).generate_content_async("hi")
+        return await first_success(call, timeout=2, hedge_after=0.05, on_hedge=lambda: hedges.append(1))
+
+    assert asyncio.run(run()).text == "hedge"
+    assert hedges == [1]
+
+
+def test_first_success_times_out():
+    async def run():
+        return await first_success(lambda: FakeModel(latency=1).generate_content_async("hi"), timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+
+def test_deadline_is_504(fake, monkeypatch):
+    monkeypatch.setitem(resilience.DEADLINES, ROUTE, 0.05)
+    fake(latency=1)
+    with pytest.raises(LLMUnavailable) as raised:
+        generate()
+    assert raised.value.status_code == 504
+    assert llm.stats["timeouts"] == 1
+
+
+def test_unavailable_maps_to_503_with_retry_after(fake):
+    import main
+
+    fake()
+    for target in (llm.routes.resolve("generate-card").primary, llm.routes.resolve("generate-card").fallback):
+        llm.breaker_for(target.model).opened_at = time.monotonic()
+    card = {"occasion": "Christmas", "recipient_name": "Sam", "sender_name": "Alex", "relationship": "friend"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/generate-card", json=card, headers={"cache-control": "no-store"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_stream_does_not_hold_a_slot_for_a_slow_client(fake):
+    fake(chunks=["a", "b", "c"], chunk_delay=0.01)
+
+    async def run():
+        stream = llm.stream_text("hi", route=ROUTE)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.1)
+        free = llm._semaphore._value
+        return [first] + [chunk async for chunk in stream], free
+
+    chunks, free = asyncio.run(run())
+    assert chunks == ["a", "b", "c"]
+    assert free == llm.LLM_CONCURRENCY
+
+
+def test_stream_disconnect_releases_the_probe(fake):
+    fake(chunks=["a", "b"], chunk_delay=0.2)
+    tripped = breaker()
+    tripped.opened_at = time.monotonic() - tripped.cooldown - 1
+
+    async def run():
+        stream = llm.stream_text("hi", route=ROUTE)
+        assert await stream.__anext__() == "a"
+        assert tripped.probing
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert not tripped.probing
+    assert tripped.state == "half-open"